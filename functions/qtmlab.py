@@ -5,6 +5,8 @@ Functions that can be used in measurements within the QTMlab framework.
 Available functions:
     move(device, variable, setpoint, rate)
     measure()
+    parallel_read(dev_var_list)
+    gather_reads(*coros)
     sweep(device, variable, start, stop, rate, npoints, filename, sweepdev, scale='lin')
     waitfor(device, variable, setpoint, threshold=0.05, tmin=60)
     record(dt, npoints, filename)
@@ -29,6 +31,8 @@ import numpy as np
 import os
 import math
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
 
 print('QTMtoolbox version 2.8.2 (2024-09-17)')
 print('----------------------------------------------------------------------')
@@ -313,6 +317,42 @@ def measure(md=None):
     return data
 
 
+def parallel_read(dev_var_list):
+    """
+    Reads a list of (<device>, <variable>) pairs concurrently, such that the
+    communication with different instruments overlaps. Reads of the same
+    device are done one after another. The values are returned in the order
+    of dev_var_list, e.g.
+        T, tint = parallel_read([(triton, 'temp5'), (fca, 'tint')])
+    """
+    # Group the read commands by device, with their index in dev_var_list
+    groups = {}
+    for i, (device, variable) in enumerate(dev_var_list):
+        groups.setdefault(id(device), []).append((i, getattr(device, 'read_' + variable)))
+
+    def read_group(group):
+        return [(i, read_command()) for i, read_command in group]
+
+    data = [None] * len(dev_var_list)
+    if not groups:
+        return data
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        futures = [pool.submit(read_group, group) for group in groups.values()]
+        for future in as_completed(futures):
+            for i, val in future.result():
+                data[i] = val
+    return data
+
+
+async def gather_reads(*coros):
+    """
+    Awaits the asyncio read functions of instruments (aread_<variable>)
+    concurrently and returns their values in order, e.g.
+        x, v, B = asyncio.run(gather_reads(li.aread_x(), dmm.aread_dcv(), ips.aread_fvalue()))
+    """
+    return await asyncio.gather(*coros)
+
+
 def sweep(device, variable, start, stop, rate, npoints, filename, sweepdev, md=None, scale='lin', precision='Normal'):
     """
     The sweep command sweeps the <variable> of <device>, from <start> to <stop>.
@@ -1095,9 +1135,10 @@ def snapshot(md=None):
     timestamp = datetime.now().strftime('%Y-%d-%m-%H%M%S')
     with open(checkfname(timestamp + 'Snapshot.txt'), 'w') as file:
         
-        # For each device, get all "read_" attributes
+        # For each device, get all attributes whose name starts with "read_". Names that only
+        # contain it, such as the coroutines aread_*, are not measured.
         for [devobj, devname]  in zip(dev_obj_list, dev_name_list):
-            attr_list = [attr for attr in dir(devobj) if 'read_' in attr]
+            attr_list = [attr for attr in dir(devobj) if attr.startswith('read_')]
             # Loop over attributes, measure property, write to file
             for attr in attr_list:
                 # Skip  type objects
@@ -10,7 +10,6 @@ University of Twente
 
 import visa
 import numpy as np
-from struct import unpack
 import matplotlib.pyplot as plt
 import time
 from datetime import datetime
@@ -39,7 +38,7 @@ def getScope(filename, samplename, GPIBaddr=1):
     headerlen = 2 + int(data[1])
     header = data[:headerlen]
     ADCwave = data[headerlen:-1]
-    ADCwave = np.array(unpack('%sB' % len(ADCwave), ADCwave))
+    ADCwave = np.frombuffer(ADCwave, dtype=np.uint8)
 
     # Convert data to scale
     V1 = (ADCwave - yoff) * ymult + yzero
@@ -63,7 +62,7 @@ def getScope(filename, samplename, GPIBaddr=1):
     headerlen = 2 + int(data[1])
     header = data[:headerlen]
     ADCwave = data[headerlen:-1]
-    ADCwave = np.array(unpack('%sB' % len(ADCwave), ADCwave))
+    ADCwave = np.frombuffer(ADCwave, dtype=np.uint8)
 
     # Convert data to scale
     V2 = (ADCwave - yoff) * ymult + yzero
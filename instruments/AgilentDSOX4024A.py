@@ -13,7 +13,6 @@ daan@daanwielens.com
 import visa
 import ast
 import numpy as np
-from struct import unpack
 
 class WrongInstrErr(Exception):
     """
@@ -103,7 +102,7 @@ class AgilentDSOX4024A:
         # Read output and convert from binary to data
         data = self.visa.read_raw()
         ADCwave = data[10:-1]
-        ADCwave = np.array(unpack('%sH' % int(len(ADCwave)/2), ADCwave)) # Unpack into unsigned short. len()/2 since every value now takes two bits 
+        ADCwave = np.frombuffer(ADCwave, dtype='<u2') # Unsigned short, little-endian (WAV:BYT LSBF)
         
         # Convert data to scale
         V = (ADCwave - pre[2]) * pre[0]
@@ -134,7 +133,7 @@ class AgilentDSOX4024A:
         # Read output and convert from binary to data
         data = self.visa.read_raw()
         ADCwave = data[10:-1]
-        ADCwave = np.array(unpack('%sH' % int(len(ADCwave)/2), ADCwave)) 
+        ADCwave = np.frombuffer(ADCwave, dtype='<u2')
         
         # Convert data to scale
         V = (ADCwave - pre[2]) * pre[0]
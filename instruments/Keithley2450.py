@@ -12,7 +12,11 @@ daan@daanwielens.com
 """
 
 import pyvisa as visa
-import time
+from . import _visa
+
+# Accepted arguments for on/off style write functions
+_ON = frozenset({1, True, 'On', 'ON', 'on', 'true', 'True'})
+_OFF = frozenset({0, False, 'Off', 'OFF', 'off'})
 
 class WrongInstrErr(Exception):
     """
@@ -24,6 +28,12 @@ class WrongInstrErr(Exception):
 
 class Keithley2450:
     type = 'Keithley 2450 SourceMeter'
+    # Pre-encoded commands for the hot paths, bypassing the str <-> bytes conversion of visa.query/write
+    CMD_MEAS_V = b'MEAS:VOLT?\n'
+    CMD_MEAS_I = b'MEAS:CURR?\n'
+    CMD_MEAS_R = b'MEAS:RES?\n'
+    CMD_SOUR_VOLT = b'SOUR:VOLT:LEV '
+    CMD_SOUR_CURR = b'SOUR:CURR:LEV '
 
     def __init__(self, addr=None, type='GPIB'):
         rm = visa.ResourceManager()
@@ -33,6 +43,8 @@ class Keithley2450:
             self.visa = rm.open_resource(addr)
         else:
             raise ValueError('Currently, connections can only be made either via USB (provide full USB::<>::INSTR string) or GPIB (provide number only).')
+        # Let VISA strip the line terminator of each response
+        self.visa.read_termination = '\n'
         # Check if device is really a Keithley 2450
         resp = self.visa.query('*IDN?')
         model = resp.split(',')[1]
@@ -47,27 +59,38 @@ class Keithley2450:
         resp = str(self.visa.query('*IDN?'))
         return resp
 
+    def batch(self):
+        return _visa.batch(self)
+
     def write_user_display(self, text1, text2):
         self.visa.write('DISP:CLE\n')
         self.visa.write('DISP:USER1:TEXT "' + text1 + '"\n')
         self.visa.write('DISP:USER2:TEXT "' + text2 + '"\n')
         
-    def beep(self, frequency, duration):
+    def beep(self, frequency, duration, wait=True):
         self.visa.write('SYST:BEEP ' + str(frequency) + ', ' + str(duration))
-        time.sleep(duration + 0.02)
+        # Let the instrument report when the beep is done, instead of sleeping for a fixed time.
+        # The query must outlast the beep, so its timeout is raised for this transaction only.
+        if wait:
+            timeout = self.visa.timeout
+            self.visa.timeout = max(timeout, float(duration)*1000 + 2000)
+            try:
+                self.visa.query('*OPC?')
+            finally:
+                self.visa.timeout = timeout
 
     def close(self):
         self.visa.close()
 
     def query(self, val):
-        resp = self.visa.query(val).strip('\n')
+        resp = self.visa.query(val)
         return resp
 
     def write(self, val):
         self.visa.write(val)
 
     def read_dcv(self):
-        resp = float(self.visa.query('SOUR:VOLT:LEV:IMM:AMPL?').strip('\n'))
+        resp = float(self.visa.query('SOUR:VOLT:LEV:IMM:AMPL?'))
         return resp
 
     def write_dcv(self, val):
@@ -76,7 +99,7 @@ class Keithley2450:
             print('<!> Warning: the device was not sourcing a voltage before. If the output was on, it has been switched off by the SMU. In that case, see on-screen warning for more information.')
             self.visa.write('SOUR:FUNC VOLT')
             self.read_sourcefunc()
-        self.visa.write('SOUR:VOLT:LEV ' + str(fval) + '\n')
+        self.visa.write_raw(self.CMD_SOUR_VOLT + str(fval).encode() + b'\n')
 
     def read_dci(self):
         resp = float(self.visa.query('SOUR:CURR:LEV:IMM:AMPL?'))
@@ -87,24 +110,27 @@ class Keithley2450:
             print('<!> Warning: the device was not sourcing current before. If the output was on, it has been switched off by the SMU. In that case, see on-screen warning for more information.')
             self.visa.write('SOUR:FUNC CURR')
             self.read_sourcefunc()
-        self.visa.write('SOUR:CURR:LEV ' + str(val) + '\n')
+        self.visa.write_raw(self.CMD_SOUR_CURR + str(val).encode() + b'\n')
 
     def read_i(self):
-        return float(self.visa.query('MEAS:CURR?').strip('\n'))
+        self.visa.write_raw(self.CMD_MEAS_I)
+        return float(self.visa.read_raw())
 
     def read_v(self):
         # Both MEAS:VOLT? and READ? take the same processing time, so no nead to use READ? for speed.
-        return float(self.visa.query('MEAS:VOLT?').strip('\n'))
+        self.visa.write_raw(self.CMD_MEAS_V)
+        return float(self.visa.read_raw())
     
     def read_r(self):
-        return float(self.visa.query('MEAS:RES?').strip('\n'))
+        self.visa.write_raw(self.CMD_MEAS_R)
+        return float(self.visa.read_raw())
     
     def read_sourcefunc(self):
-        self.source_func = self.visa.query('SOUR:FUNC?').strip('\n').replace('"', '')
+        self.source_func = self.visa.query('SOUR:FUNC?').replace('"', '')
         return self.source_func
     
     def read_sensefunc(self):
-        self.sense_func = self.visa.query('SENS:FUNC?').strip('\n').replace('"', '')
+        self.sense_func = self.visa.query('SENS:FUNC?').replace('"', '')
         return self.sense_func
     
     def write_sourcefunc(self, val):
@@ -116,6 +142,8 @@ class Keithley2450:
     def write_sensefunc(self, val):
         if val in ['"VOLT"', '"CURR"', '"RES"']:
             self.write('SENS:FUNC ' + val) 
+            # Keep the cached sense function in the format that SENS:FUNC? returns
+            self.sense_func = {'"VOLT"': 'VOLT:DC', '"CURR"': 'CURR:DC', '"RES"': 'RES'}[val]
         else:
             raise ValueError('One can either provide VOLT, CURR or RES as inputs')
 
@@ -131,11 +159,11 @@ class Keithley2450:
 
     def read_Vcompliance(self):
         # This is a VOLTAGE compliance belonging to a CURRENT source
-        return float(self.query('SOUR:CURR:VLIM?').strip('\n'))
+        return float(self.query('SOUR:CURR:VLIM?'))
 
     def read_Icompliance(self):
         # This is a CURRENT compliance belonging to a VOLTAGE source
-        return float(self.query('SOUR:VOLT:ILIM?').strip('\n'))
+        return float(self.query('SOUR:VOLT:ILIM?'))
 
     def write_Vcompliance(self, val):
         # This is a VOLTAGE compliance belonging to a CURRENT source
@@ -148,39 +176,45 @@ class Keithley2450:
         self.visa.write('SOUR:VOLT:ILIM ' + str(val) + '\n')
 
     def read_output(self):
-        resp = int(self.visa.query('OUTP?').strip('\n'))
+        resp = int(self.visa.query('OUTP?'))
         return resp
 
     def write_output(self, val):
-        if val in [1, 'On', 'ON', 'on']:
+        if val in _ON:
             self.visa.write('OUTP 1\n')
-        elif val in [0, 'Off', 'OFF', 'off']:
+        elif val in _OFF:
             self.visa.write('OUTP 0\n')
         else:
             print('This is not a valid argument for the Keithley Output command. Your command will be ignored.')
 
     def read_inttrip(self):
-        resp = int(self.visa.query('OUTP:INT:TRIP?\n').strip('\n'))
+        resp = int(self.visa.query('OUTP:INT:TRIP?\n'))
         return resp
 
     def read_readback(self):
-        resp = int(self.visa.query('SOUR:VOLT:READ:BACK?\n').strip('\n'))
+        resp = int(self.visa.query('SOUR:VOLT:READ:BACK?\n'))
         return resp
 
     def write_readback(self, val):
         # Get current function
         func = self.query('SOUR:FUNC?')
         # Set readback on/off
-        if val in [1, 'On', 'ON', 'on']:
+        if val in _ON:
             self.visa.write('SOUR:' + func + ':READ:BACK ON')
-        if val in [0, 'Off', 'OFF', 'off']:
+        if val in _OFF:
             self.visa.write('SOUR:' + func + ':READ:BACK OFF')
     
+    def read_avg(self):
+        # Read nPLC and averaging count in a single transaction, based on the cached sense function
+        if self.sense_func in ['VOLT:DC', 'CURR:DC']:
+            func = self.sense_func.split(':')[0]
+            resp = self.query('SENS:{0}:NPLC?;:SENS:{0}:AVER:COUN?'.format(func)).split(';')
+            return float(resp[0]), float(resp[1])
+
     def read_avgnplc(self):
-        if self.sense_func == 'VOLT:DC':
-            return float(self.query('SENS:VOLT:NPLC?'))
-        if self.sense_func == 'CURR:DC':
-            return float(self.query('SENS:CURR:NPLC?'))
+        resp = self.read_avg()
+        if resp is not None:
+            return resp[0]
         
     def write_avgnplc(self, val):
         if self.sense_func == 'VOLT:DC':
@@ -190,19 +224,18 @@ class Keithley2450:
         
         
     def read_avgnpts(self):
-        if self.sense_func == 'VOLT:DC':
-            return float(self.query('SENS:VOLT:AVER:COUN?'))
-        elif self.sense_func == 'CURR:DC':
-            return float(self.query('SENS:CURR:AVER:COUN?'))
+        resp = self.read_avg()
+        if resp is not None:
+            return resp[1]
     
     # Select local (2-wire == 0/OFF) or remote (4-wire == 1/ON) sensing. 
     def write_remotesense(self, val):
-        if val in [1, 'On', 'on', 'ON']:
+        if val in _ON:
             if self.sense_func == 'VOLT:DC':
                 self.visa.write('SENS:VOLT:RSEN ON')
             if self.sense_func == 'CURR:DC':
                 self.visa.write('SENS:CURR:RSEN ON')
-        elif val in [0, 'Off', 'off', 'OFF']:
+        elif val in _OFF:
             if self.sense_func == 'VOLT:DC':
                 self.visa.write('SENS:VOLT:RSEN OFF')
             if self.sense_func == 'CURR:DC':
@@ -212,9 +245,9 @@ class Keithley2450:
         
     def read_remotesense(self):
         if self.sense_func == 'VOLT:DC':
-            return self.visa.query('SENS:VOLT:RSEN?').strip('\n')
+            return self.visa.query('SENS:VOLT:RSEN?')
         if self.sense_func == 'CURR:DC':
-            return self.visa.query('SENS:CURR:RSEN?').strip('\n')        
+            return self.visa.query('SENS:CURR:RSEN?')        
             
     def info(self):
         print('-----------------------------------------------------')
@@ -229,7 +262,10 @@ class Keithley2450:
         print('Source readback    :          ' + str(self.read_readback())) 
         print('-----------------------------------------------------')
         print('Measurement mode   :          ' + str(self.read_sensefunc()))
-        print('nPLC averaging     :          ' + str(self.read_avgnplc()))
+        avg = self.read_avg()
+        if avg is not None:
+            print('nPLC averaging     :          ' + str(avg[0]))
+            print('Averaging count    :          ' + str(avg[1]))
         print('-----------------------------------------------------')
 
         
@@ -12,7 +12,11 @@ daan@daanwielens.com
 """
 
 import pyvisa as visa
-import time
+from . import _visa
+
+# Accepted arguments for on/off style write functions
+_ON = frozenset({1, True, 'On', 'ON', 'on', 'true', 'True'})
+_OFF = frozenset({0, False, 'Off', 'OFF', 'off'})
 
 class WrongInstrErr(Exception):
     """
@@ -33,17 +37,17 @@ class Keithley6500:
             self.visa = rm.open_resource(addr)
         else:
             raise ValueError('Connections can either be made via USB or GPIB at the moment.')
+        # Let VISA strip the line terminator of each response
+        self.visa.read_termination = '\n'
         # Check if device is really a Keithley 2000
         resp = self.visa.query('*IDN?')
         model = resp.split(',')[1]
         if model != 'MODEL DMM6500':
             raise WrongInstrErr('Expected Keithley 6500, got {}'.format(resp)) 
-        # Increase timeout, because changing mode (i.e. read_dcv(), then read_acv()) takes time for to initialize
-        self.visa.timeout = 5000
         # Beep for measurement
         self.notify = False
         # Get current config of the device
-        self.config = self.visa.query('FUNC?').strip('\n')
+        self.config = self.visa.query('FUNC?')
     
     def get_iden(self):
         resp = str(self.visa.query('*IDN?'))
@@ -56,23 +60,35 @@ class Keithley6500:
     def write(self, val):
         self.visa.write(val)
     
+    def batch(self):
+        return _visa.batch(self)
+
     def close(self):
         self.visa.close()
         
     # Read function type
     def read_func(self):
-        return self.query('FUNC?').strip('\n')
+        return self.query('FUNC?')
     
     # Make a sound    
-    def beep(self, frequency, duration):
+    def beep(self, frequency, duration, wait=True):
         self.visa.write('SYST:BEEP ' + str(frequency) + ', ' + str(duration))
-        time.sleep(duration + 0.02)
+        # Let the instrument report when the beep is done, instead of sleeping for a fixed time.
+        # The query must outlast the beep, so its timeout is raised for this transaction only.
+        if wait:
+            timeout = self.visa.timeout
+            self.visa.timeout = max(timeout, float(duration)*1000 + 2000)
+            try:
+                self.visa.query('*OPC?')
+            finally:
+                self.visa.timeout = timeout
         
     # Use the current measurement mode and return one reading
     def read(self):
         if self.notify:
-            self.beep(1569.98, 0.05)
-            self.beep(2093, 0.1)
+            # The instrument queues the beeps, so there is no need to wait for them
+            self.beep(1569.98, 0.05, wait=False)
+            self.beep(2093, 0.1, wait=False)
         return float(self.query('READ?'))
     
     # If the device is in DC voltage mode, return one reading. Otherwise, return a warning and a very high value    
@@ -111,14 +127,22 @@ class Keithley6500:
     def write_func(self, val):
         valid_vals = ['VOLT:DC', 'VOLT:AC', 'CURR:DC', 'CURR:AC', 'RES', 'FRES', 'DIOD', 'CAP', 'TEMP', 'CONT', 'FREQ:VOLT', 'PER:VOLT', 'VOLT:DC:RAT', 'DIG:VOLT', 'DIG:CURR']
         if val in valid_vals:
-            self.write('FUNC "' + val + '"')
+            # Changing mode takes time to initialize, so only this transaction gets an increased timeout.
+            # Appending *OPC? makes the switch and the wait for completion a single transaction.
+            timeout = self.visa.timeout
+            self.visa.timeout = 5000
+            try:
+                self.visa.query('FUNC "' + val + '";*OPC?')
+            finally:
+                self.visa.timeout = timeout
+            self.config = val
         else:
             raise ValueError('The specified function is not in the list of options.')
     
     # Read averaging type. Note: command is determined by current function, so first request function
     def read_avgtype(self):
         func = self.read_func()
-        return self.visa.query(func + ':AVER:TCON?').strip('\n')
+        return self.visa.query(func + ':AVER:TCON?')
     
     def write_avgtype(self, val):
         if val in ['MOV', 'REP']:
@@ -129,7 +153,7 @@ class Keithley6500:
         
     def read_avgcount(self):
         func = self.read_func()
-        return self.visa.query(func + ':AVER:COUN?').strip('\n')
+        return self.visa.query(func + ':AVER:COUN?')
     
     def write_avgcount(self, val):
         if int(val) >= 1 and int(val) <= 100:
@@ -140,13 +164,13 @@ class Keithley6500:
             
     def read_avgstate(self):
         func = self.read_func()
-        return self.visa.query(func + ':AVER:STAT?').strip('\n')
+        return self.visa.query(func + ':AVER:STAT?')
     
     def write_avgstate(self, val):
         func = self.read_func()
-        if val in [1, 'On', 'ON', 'on']:
+        if val in _ON:
             self.visa.write(func + ':AVER:STAT ON')
-        elif val in [0, 'Off', 'OFF', 'off']:
+        elif val in _OFF:
             self.visa.write(func + ':AVER:STAT OFF')
         else:
             raise ValueError('This is not a valid state.')
@@ -154,7 +178,7 @@ class Keithley6500:
     def read_avgnplc(self):
         func = self.read_func()
         if func in ['VOLT:DC', 'CURR:DC', 'RES', 'FRES', 'DIOD', 'TEMP', 'VOLT:DC:RAT']:
-            return float(self.visa.query(func + ':NPLC?').strip('\n'))
+            return float(self.visa.query(func + ':NPLC?'))
         else:
             raise ValueError('The PLC commands are only valid for DC measurement types.')
     
@@ -169,12 +193,12 @@ class Keithley6500:
             raise ValueError('The filter count should lie within 0.01 - 10.') 
             
     def read_conttrig(self):
-        return float(self.visa.query('INIT:CONT?').strip('\n'))
+        return float(self.visa.query('INIT:CONT?'))
     
     def write_conttrig(self, val):
-        if val in [1, 'On', 'ON', 'on']:
+        if val in _ON:
             self.visa.write('INIT:CONT ON')
-        elif val in [0, 'Off', 'OFF', 'off']:
+        elif val in _OFF:
             self.visa.write('INIT:CONT OFF')
         else:
             raise ValueError('This is not a valid state.')             
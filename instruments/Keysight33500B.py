@@ -10,6 +10,11 @@ d.h.wielens@utwente.nl
 """
 
 import pyvisa as visa
+from . import _visa
+
+# Accepted arguments for on/off style write functions
+_ON = frozenset({1, True, 'On', 'ON', 'on', 'true', 'True'})
+_OFF = frozenset({0, False, 'Off', 'OFF', 'off'})
 
 class WrongInstrErr(Exception):
     """
@@ -25,6 +30,8 @@ class Keysight33500B:
     def __init__(self, GPIBaddr):
         rm = visa.ResourceManager()
         self.visa = rm.open_resource('GPIB0::{}::INSTR'.format(GPIBaddr))
+        # Let VISA strip the line terminator of each response
+        self.visa.read_termination = '\n'
         # Check if device is really a Keysight 33500B series
         resp = self.visa.query('*IDN?')
         model = resp.split(',')[1]
@@ -36,12 +43,15 @@ class Keysight33500B:
         return resp
 
     def query(self, val):
-        resp = self.visa.query(val).strip('\n')
+        resp = self.visa.query(val)
         return resp
 
     def close(self):
         self.visa.close()
 
+    def batch(self):
+        return _visa.batch(self)
+
     def read_amp(self):
         resp = float(self.visa.query('SOUR:VOLT?'))
         return resp
@@ -67,7 +77,7 @@ class Keysight33500B:
         self.visa.write('SOUR:FREQ ' + str(val))
 
     def read_waveform(self):
-        resp = self.visa.query('SOUR:FUNC?').strip('\n')
+        resp = self.visa.query('SOUR:FUNC?')
         return resp
 
     def write_waveform(self, val):
@@ -98,7 +108,7 @@ class Keysight33500B:
         self.visa.write('SOUR:FUNC:RAMP:SYMM ' + str(val))
 
     def read_output(self):
-        resp = self.visa.query('OUTP?').strip('\n')
+        resp = self.visa.query('OUTP?')
         return resp
     
     def write_pulsedutycycle(self, val):
@@ -154,7 +164,7 @@ class Keysight33500B:
             raise ValueError('The pulse width should be between 16 ns and 1/f.')  
 
     def read_load(self):
-        resp = self.visa.query('OUTP:LOAD?').strip('\n')
+        resp = self.visa.query('OUTP:LOAD?')
         # Note that the device returns 9.9E+37 if the load is INF.
         return resp
 
@@ -186,9 +196,9 @@ class Keysight33500B:
         self.write_symm(symm)
 
     def write_output(self, val):
-        if val in ['ON', 'on', 1]:
+        if val in _ON:
             self.visa.write('OUTP 1')
-        if val in ['OFF', 'off', 0]:
+        if val in _OFF:
             self.visa.write('OUTP 0')
             
     def read_phase(self):
@@ -18,6 +18,13 @@ then cycle through menu with <Enter>):
 """
 
 import pyvisa as visa
+from . import _visa
+
+# Accepted arguments for write_range, mapped to the heater range number
+_RANGES = {'Off': 0, 'off': 0, 0: 0,
+           'Low': 1, 'low': 1, 1: 1,
+           'Medium': 2, 'medium': 2, 2: 2,
+           'High': 3, 'high': 3, 3: 3}
 
 class WrongInstrErr(Exception):
     """
@@ -50,6 +57,9 @@ class Lake332:
         resp = self.visa.query(val).strip('\n')
         return resp
 
+    def batch(self):
+        return _visa.batch(self, scpi=False)
+
     def read_temp(self):
         resp = float(self.visa.query('KRDG? A'))
         return resp
@@ -66,14 +76,14 @@ class Lake332:
         self.visa.write('SETP 1,' + str(setp))
 
     def write_range(self, val):
-        if val in ['Off', 'off', 0]:
-            self.visa.write('RANGE 0')
-        if val in ['Low', 'low', 1]:
-            self.visa.write('RANGE 1')
-        if val in ['Medium', 'medium', 2]:
-            self.visa.write('RANGE 2')
-        if val in ['High', 'high', 3]:
-            self.visa.write('RANGE 3')
+        if val in _RANGES:
+            self.visa.write('RANGE ' + str(_RANGES[val]))
+
+    def configure(self, P, I, D, setp, rng):
+        # Set PID, setpoint and heater range of loop 1 in a single GPIB transaction
+        if rng not in _RANGES:
+            raise ValueError('The heater range should be Off, Low, Medium or High (0 - 3).')
+        self.visa.write('PID 1,{},{},{};SETP 1,{};RANGE {}'.format(P, I, D, setp, _RANGES[rng]))
 
     def heater_off(self):
         self.visa.write('RANGE 0')
@@ -9,41 +9,45 @@ University of Twente
 d.h.wielens@utwente.nl
 """
 
-import pyvisa as visa
-import time
+from . import _visa
+from . import _mercury
+from ._cache import ttl_cache, Memoized, SETTING_TTL
 
-class MercuryiPS:
+class MercuryiPS(Memoized):
     type = 'MercuryiPS'
 
     def __init__(self):
-        rm = visa.ResourceManager()
-        self.visa = rm.open_resource('GPIB0::1::1::INSTR')
+        self.visa = _visa.get_rm().open_resource('GPIB0::1::1::INSTR')
+        self.visa.timeout = 2000
+        self.visa.read_termination = '\n'
+        self.visa.write_termination = '\n'
+        self._init_cache()
 
     def close(self):
         self.visa.close()
 
     def visa_query(self, val):
-        cmd = val + '\n'
-        resp = self.visa.query(cmd)
+        resp = self.visa.query(val)
         return resp
 
+    @ttl_cache(seconds=float('inf'))
     def get_iden(self):
         resp = self.visa.query('*IDN?')
         return resp
 
     def read_fvalueX(self):
         resp = self.visa.query('READ:DEV:GRPX:PSU:SIG:FLD')
-        resp = float(resp.split(':')[-1].strip('T\n'))
+        resp = _mercury.parse_num(resp)
         return resp
 
     def read_fvalueY(self):
         resp = self.visa.query('READ:DEV:GRPY:PSU:SIG:FLD')
-        resp = float(resp.split(':')[-1].strip('T\n'))
+        resp = _mercury.parse_num(resp)
         return resp
 
     def read_fvalueZ(self):
         resp = self.visa.query('READ:DEV:GRPZ:PSU:SIG:FLD')
-        resp = float(resp.split(':')[-1].strip('T\n'))
+        resp = _mercury.parse_num(resp)
         return resp
 
     def read_vector(self):
@@ -53,18 +57,27 @@ class MercuryiPS:
         return [val_x, val_y, val_z]
 
     def write_fvalueX(self, val):
-        self.visa.query('SET:DEV:GRPX:PSU:SIG:FSET:' + str(val))
-        time.sleep(0.5)
+        self._cache.pop('read_setpX', None)
+        # The iPS acknowledges a setpoint with ':VALID', after which RTOS can be sent right away
+        ack = self.visa.query('SET:DEV:GRPX:PSU:SIG:FSET:%.6f' % float(val))
+        if ':VALID' not in ack:
+            raise RuntimeError('The MercuryiPS did not accept the setpoint: ' + ack)
         self.visa.query('SET:DEV:GRPX:PSU:ACTN:RTOS')
 
     def write_fvalueY(self, val):
-        self.visa.query('SET:DEV:GRPY:PSU:SIG:FSET:' + str(val))
-        time.sleep(0.5)
+        self._cache.pop('read_setpY', None)
+        # The iPS acknowledges a setpoint with ':VALID', after which RTOS can be sent right away
+        ack = self.visa.query('SET:DEV:GRPY:PSU:SIG:FSET:%.6f' % float(val))
+        if ':VALID' not in ack:
+            raise RuntimeError('The MercuryiPS did not accept the setpoint: ' + ack)
         self.visa.query('SET:DEV:GRPY:PSU:ACTN:RTOS')
 
     def write_fvalueZ(self, val):
-        self.visa.query('SET:DEV:GRPZ:PSU:SIG:FSET:' + str(val))
-        time.sleep(0.5)
+        self._cache.pop('read_setpZ', None)
+        # The iPS acknowledges a setpoint with ':VALID', after which RTOS can be sent right away
+        ack = self.visa.query('SET:DEV:GRPZ:PSU:SIG:FSET:%.6f' % float(val))
+        if ':VALID' not in ack:
+            raise RuntimeError('The MercuryiPS did not accept the setpoint: ' + ack)
         self.visa.query('SET:DEV:GRPZ:PSU:ACTN:RTOS')
 
     def write_vector(self, val):
@@ -73,19 +86,22 @@ class MercuryiPS:
             self.write_fvalueY(val[1])
             self.write_fvalueZ(val[2])
 
+    @ttl_cache(seconds=SETTING_TTL)
     def read_rateX(self):
         resp = self.visa.query('READ:DEV:GRPX:PSU:SIG:RFST')
-        resp = float(resp.split(':')[-1].strip('T/m\n'))
+        resp = _mercury.parse_num(resp)
         return resp
 
+    @ttl_cache(seconds=SETTING_TTL)
     def read_rateY(self):
         resp = self.visa.query('READ:DEV:GRPY:PSU:SIG:RFST')
-        resp = float(resp.split(':')[-1].strip('T/m\n'))
+        resp = _mercury.parse_num(resp)
         return resp
 
+    @ttl_cache(seconds=SETTING_TTL)
     def read_rateZ(self):
         resp = self.visa.query('READ:DEV:GRPZ:PSU:SIG:RFST')
-        resp = float(resp.split(':')[-1].strip('T/m\n'))
+        resp = _mercury.parse_num(resp)
         return resp
 
     def read_rates(self):
@@ -95,49 +111,49 @@ class MercuryiPS:
         return [rate_x, rate_y, rate_z]
 
     def write_rateX(self, val):
-        self.visa.query('SET:DEV:GRPX:PSU:SIG:RFST:' + str(val))
+        self._cache.pop('read_rateX', None)
+        self.visa.query('SET:DEV:GRPX:PSU:SIG:RFST:%.6f' % float(val))
 
     def write_rateY(self, val):
-        self.visa.query('SET:DEV:GRPY:PSU:SIG:RFST:' + str(val))
+        self._cache.pop('read_rateY', None)
+        self.visa.query('SET:DEV:GRPY:PSU:SIG:RFST:%.6f' % float(val))
 
     def write_rateZ(self, val):
-        self.visa.query('SET:DEV:GRPZ:PSU:SIG:RFST:' + str(val))
+        self._cache.pop('read_rateZ', None)
+        self.visa.query('SET:DEV:GRPZ:PSU:SIG:RFST:%.6f' % float(val))
 
     def read_state(self):
-        respX = self.visa.query('READ:DEV:GRPX:PSU:ACTN').split(':')[-1].strip('\n')
-        time.sleep(0.05)
-        respY = self.visa.query('READ:DEV:GRPY:PSU:ACTN').split(':')[-1].strip('\n')
-        time.sleep(0.05)
-        respZ = self.visa.query('READ:DEV:GRPZ:PSU:ACTN').split(':')[-1].strip('\n')
+        respX = self.visa.query('READ:DEV:GRPX:PSU:ACTN').split(':')[-1]
+        respY = self.visa.query('READ:DEV:GRPY:PSU:ACTN').split(':')[-1]
+        respZ = self.visa.query('READ:DEV:GRPZ:PSU:ACTN').split(':')[-1]
         msg = '(X) : ' + respX + ', (Y) : ' + respY + ', (Z) : ' + respZ
         return msg
 
+    @ttl_cache(seconds=1.0)
     def read_temp(self):
         resp = self.visa.query('READ:DEV:MB1.T1:TEMP:SIG:TEMP')
-        resp = float(resp.split(':')[-1].strip('K\n'))
+        resp = _mercury.parse_num(resp)
         return resp
 
     def read_status(self):
-        respX = self.visa.query('READ:DEV:GRPX:PSU:ACTN').split(':')[-1].strip('\n')
-        time.sleep(0.05)
-        respY = self.visa.query('READ:DEV:GRPY:PSU:ACTN').split(':')[-1].strip('\n')
-        time.sleep(0.05)
-        respZ = self.visa.query('READ:DEV:GRPZ:PSU:ACTN').split(':')[-1].strip('\n')
+        respX = self.visa.query('READ:DEV:GRPX:PSU:ACTN').split(':')[-1]
+        respY = self.visa.query('READ:DEV:GRPY:PSU:ACTN').split(':')[-1]
+        respZ = self.visa.query('READ:DEV:GRPZ:PSU:ACTN').split(':')[-1]
         if respX == 'HOLD' and respY == 'HOLD' and respZ == 'HOLD':
             return 'HOLD'
         if respX != 'HOLD' or respY != 'HOLD' or respZ != 'HOLD':
             return 'MOVING'
         
     def read_statusX(self):
-        resp = self.visa.query('READ:DEV:GRPX:PSU:ACTN').split(':')[-1].strip('\n')
+        resp = self.visa.query('READ:DEV:GRPX:PSU:ACTN').split(':')[-1]
         return resp
 
     def read_statusY(self):
-        resp = self.visa.query('READ:DEV:GRPY:PSU:ACTN').split(':')[-1].strip('\n')
+        resp = self.visa.query('READ:DEV:GRPY:PSU:ACTN').split(':')[-1]
         return resp
 
     def read_statusZ(self):
-        resp = self.visa.query('READ:DEV:GRPZ:PSU:ACTN').split(':')[-1].strip('\n')
+        resp = self.visa.query('READ:DEV:GRPZ:PSU:ACTN').split(':')[-1]
         return resp
 
     def read_alarm(self):
@@ -146,23 +162,17 @@ class MercuryiPS:
 
     def gotozero(self):
         self.visa.query('SET:DEV:GRPX:PSU:ACTN:RTOZ')
-        time.sleep(0.05)
         self.visa.query('SET:DEV:GRPY:PSU:ACTN:RTOZ')
-        time.sleep(0.05)
         self.visa.query('SET:DEV:GRPZ:PSU:ACTN:RTOZ')
 
     def clamp(self):
         self.visa.query('SET:DEV:GRPX:PSU:ACTN:CLMP')
-        time.sleep(0.05)
         self.visa.query('SET:DEV:GRPY:PSU:ACTN:CLMP')
-        time.sleep(0.05)
         self.visa.query('SET:DEV:GRPZ:PSU:ACTN:CLMP')
 
     def hold(self):
         self.visa.query('SET:DEV:GRPX:PSU:ACTN:HOLD')
-        time.sleep(0.05)
         self.visa.query('SET:DEV:GRPY:PSU:ACTN:HOLD')
-        time.sleep(0.05)
         self.visa.query('SET:DEV:GRPZ:PSU:ACTN:HOLD')
         
     def holdX(self):
@@ -174,14 +184,17 @@ class MercuryiPS:
     def holdZ(self):
         self.visa.query('SET:DEV:GRPZ:PSU:ACTN:HOLD')        
 
+    @ttl_cache(seconds=SETTING_TTL)
     def read_setpX(self):
         resp = self.visa.query('READ:DEV:GRPX:PSU:SIG:FSET')
-        return float(resp.split(':')[-1].strip('T\n'))
+        return _mercury.parse_num(resp)
 
+    @ttl_cache(seconds=SETTING_TTL)
     def read_setpY(self):
         resp = self.visa.query('READ:DEV:GRPY:PSU:SIG:FSET')
-        return float(resp.split(':')[-1].strip('T\n'))
+        return _mercury.parse_num(resp)
 
+    @ttl_cache(seconds=SETTING_TTL)
     def read_setpZ(self):
         resp = self.visa.query('READ:DEV:GRPZ:PSU:SIG:FSET')
-        return float(resp.split(':')[-1].strip('T\n'))
+        return _mercury.parse_num(resp)
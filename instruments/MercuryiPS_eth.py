@@ -10,9 +10,38 @@ daan@daanwielens.com
 """
 
 import socket
+import asyncio
+import collections
+import time
+import threading
+from . import _mercury
+from ._cache import ttl_cache, Memoized, SETTING_TTL
 
-class MercuryiPS:
+# Field vector as returned by read_vector_nt. Being a tuple, a list of Vectors can be
+# turned into an (n, 3) array with np.array() directly.
+Vector = collections.namedtuple('Vector', 'x y z')
+
+# Time (s) after which a connection attempt or transaction is given up, such that a device that
+# does not respond raises an error instead of hanging the measurement
+_TIMEOUT = 5.0
+
+# Commands that are sent by the background poller: fields, rates and states of all axes
+_POLL_CMDS = ['READ:DEV:GRPX:PSU:SIG:FLD', 'READ:DEV:GRPY:PSU:SIG:FLD', 'READ:DEV:GRPZ:PSU:SIG:FLD',
+              'READ:DEV:GRPX:PSU:SIG:RFST', 'READ:DEV:GRPY:PSU:SIG:RFST', 'READ:DEV:GRPZ:PSU:SIG:RFST',
+              'READ:DEV:GRPX:PSU:ACTN', 'READ:DEV:GRPY:PSU:ACTN', 'READ:DEV:GRPZ:PSU:ACTN']
+
+class MercuryiPS(Memoized):
     type = 'MercuryiPS'
+    # Command prefixes for the write functions, prepared as bytes once
+    _SET_FSET_X = b'SET:DEV:GRPX:PSU:SIG:FSET:'
+    _SET_FSET_Y = b'SET:DEV:GRPY:PSU:SIG:FSET:'
+    _SET_FSET_Z = b'SET:DEV:GRPZ:PSU:SIG:FSET:'
+    _SET_RFST_X = b'SET:DEV:GRPX:PSU:SIG:RFST:'
+    _SET_RFST_Y = b'SET:DEV:GRPY:PSU:SIG:RFST:'
+    _SET_RFST_Z = b'SET:DEV:GRPZ:PSU:SIG:RFST:'
+    _RTOS_X = b'SET:DEV:GRPX:PSU:ACTN:RTOS\r\n'
+    _RTOS_Y = b'SET:DEV:GRPY:PSU:ACTN:RTOS\r\n'
+    _RTOS_Z = b'SET:DEV:GRPZ:PSU:ACTN:RTOS\r\n'
 
     def __init__(self, IPaddress, port=7020):
         # Port should be a number, not a string
@@ -21,171 +50,385 @@ class MercuryiPS:
         # Prepare socket instance
         self.s = socket.socket()
         self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Short commands should be sent immediately instead of being delayed by Nagle's algorithm
+        self.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Do not hang the measurement when the iPS does not respond
+        self.s.settimeout(_TIMEOUT)
         self.s.connect((IPaddress, port))
+        # Persistent receive buffer, see _query_raw
+        self._rxbuf = bytearray(4096)
+        self._rxview = memoryview(self._rxbuf)
+        self._init_cache()
+        # Background polling, see start_polling
+        self._lock = threading.Lock()
+        self._poller = None
+        self._snapshot = None
+        # Incremented by every write, see _invalidate
+        self._generation = 0
 
     def close(self):
+        self.stop_polling()
         self.s.close()
         
     def query(self, val):
-        cmd = val + '\r\n'
-        self.s.sendall(cmd.encode())
-        resp = self.s.recv(1400).decode()
-        return resp
+        return self._query_many([val])[0]
+
+    def _query_many(self, cmds):
+        return self._query_raw([('\r\n'.join(cmds) + '\r\n').encode()], len(cmds))
+
+    def _send_parts(self, parts):
+        # Send a list of bytes objects as one message. sendmsg gathers the parts in the
+        # kernel, so they do not have to be joined first. It is not available on Windows,
+        # and it may send only part of the data; in those cases fall back to sendall.
+        if not hasattr(self.s, 'sendmsg'):
+            self.s.sendall(b''.join(parts))
+            return
+        sent = self.s.sendmsg(parts)
+        if sent < sum(len(p) for p in parts):
+            self.s.sendall(b''.join(parts)[sent:])
+
+    def _query_raw(self, parts, n):
+        # Send the message parts (bytes) with n commands in one go and collect one response
+        # line per command, such that only a single network round trip is needed. The lock
+        # prevents that the polling thread and the user interleave their commands on the socket.
+        with self._lock:
+            self._send_parts(parts)
+            # Receive into the persistent buffer instead of allocating a new bytes object per recv
+            end = 0
+            while self._rxbuf.count(b'\n', 0, end) < n:
+                if end == len(self._rxbuf):
+                    # Grow the buffer for long replies (the view must be released first)
+                    self._rxview.release()
+                    self._rxbuf.extend(bytes(len(self._rxbuf)))
+                    self._rxview = memoryview(self._rxbuf)
+                nbytes = self.s.recv_into(self._rxview[end:])
+                if not nbytes:
+                    raise ConnectionError('The connection to the MercuryiPS was closed.')
+                end += nbytes
+            resp = str(self._rxview[:end], 'ascii')
+        return resp.split('\n')[:n]
+
+    def start_polling(self, interval=0.2):
+        # Poll the field, rates and state in a background thread. While polling, the
+        # read functions return the most recent snapshot instead of querying the device.
+        if self._poller is not None:
+            return
+        self._stop = False
+        self._poller = threading.Thread(target=self._poll, args=(interval,), daemon=True)
+        self._poller.start()
 
+    def stop_polling(self):
+        poller = self._poller
+        if poller is not None:
+            self._stop = True
+            poller.join()
+            self._poller = None
+            self._snapshot = None
+
+    def _poll(self, interval):
+        # If a query fails (timeout, lost connection, unexpected response), the exception ends the
+        # thread and is reported by Python; the read functions then query the device again.
+        try:
+            while not self._stop:
+                generation = self._generation
+                resp = self._query_many(_POLL_CMDS)
+                fields = [_mercury.parse_num(r) for r in resp[0:3]]
+                rates = [_mercury.parse_num(r) for r in resp[3:6]]
+                states = [r.split(':')[-1] for r in resp[6:9]]
+                # Discard the result if a write was done meanwhile, it may predate that write.
+                # Check and store under the lock, such that _invalidate cannot come in between.
+                with self._lock:
+                    if generation == self._generation:
+                        self._snapshot = (fields, rates, states)
+                time.sleep(interval)
+        finally:
+            self._snapshot = None
+            self._poller = None
+
+    def _invalidate(self):
+        # Called after every write: the snapshot no longer reflects the state of the device
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    @ttl_cache(seconds=float('inf'))
     def get_iden(self):
-        self.s.sendall('*IDN?\r\n'.encode())
-        resp = self.s.recv(1400).decode()
+        resp = self.query('*IDN?')
         return resp
     
     def read_fvalueX(self):
-        self.s.sendall('READ:DEV:GRPX:PSU:SIG:FLD\r\n'.encode())
-        resp = self.s.recv(1400).decode()
-        resp = float(resp.split(':')[-1].strip('T\n'))
+        if self._snapshot is not None:
+            return self._snapshot[0][0]
+        resp = self.query('READ:DEV:GRPX:PSU:SIG:FLD')
+        resp = _mercury.parse_num(resp)
         return resp
     
     def read_fvalueY(self):
-        self.s.sendall('READ:DEV:GRPY:PSU:SIG:FLD\r\n'.encode())
-        resp = self.s.recv(1400).decode()
-        resp = float(resp.split(':')[-1].strip('T\n'))
+        if self._snapshot is not None:
+            return self._snapshot[0][1]
+        resp = self.query('READ:DEV:GRPY:PSU:SIG:FLD')
+        resp = _mercury.parse_num(resp)
         return resp
 
     def read_fvalueZ(self):
-        self.s.sendall('READ:DEV:GRPZ:PSU:SIG:FLD\r\n'.encode())
-        resp = self.s.recv(1400).decode()
-        resp = float(resp.split(':')[-1].strip('T\n'))
+        if self._snapshot is not None:
+            return self._snapshot[0][2]
+        resp = self.query('READ:DEV:GRPZ:PSU:SIG:FLD')
+        resp = _mercury.parse_num(resp)
         return resp
     
     def read_vector(self):
-        val_x = self.read_fvalueX()
-        val_y = self.read_fvalueY()
-        val_z = self.read_fvalueZ()
-        return [val_x, val_y, val_z]
+        if self._snapshot is not None:
+            return list(self._snapshot[0])
+        resp = self._query_many(['READ:DEV:GRPX:PSU:SIG:FLD', 'READ:DEV:GRPY:PSU:SIG:FLD', 'READ:DEV:GRPZ:PSU:SIG:FLD'])
+        return [_mercury.parse_num(r) for r in resp]
+
+    def read_vector_nt(self):
+        # Same as read_vector, but returns a Vector(x, y, z) named tuple
+        if self._snapshot is not None:
+            return Vector._make(self._snapshot[0])
+        resp = self._query_many(['READ:DEV:GRPX:PSU:SIG:FLD', 'READ:DEV:GRPY:PSU:SIG:FLD', 'READ:DEV:GRPZ:PSU:SIG:FLD'])
+        return Vector._make(map(_mercury.parse_num, resp))
         
+    # In the write functions, values are sent with 6 decimals (as %.6f), which is beyond the resolution of the iPS
     def write_fvalueX(self, val):
-        cmd = 'SET:DEV:GRPX:PSU:SIG:FSET:' + str(val) + '\r\n'
-        self.s.sendall(cmd.encode())
-        self.s.recv(1400)
-        # We also want the magnet to go to this setpoint, so
-        self.s.sendall('SET:DEV:GRPX:PSU:ACTN:RTOS\r\n'.encode())
-        self.s.recv(1400)
+        # We also want the magnet to go to this setpoint, so send RTOS along with the setpoint
+        self._query_raw([self._SET_FSET_X, b'%.6f\r\n' % float(val), self._RTOS_X], 2)
+        self._invalidate()
 
     def write_fvalueY(self, val):
-        cmd = 'SET:DEV:GRPY:PSU:SIG:FSET:' + str(val) + '\r\n'
-        self.s.sendall(cmd.encode())
-        self.s.recv(1400)
-        # We also want the magnet to go to this setpoint, so
-        self.s.sendall('SET:DEV:GRPY:PSU:ACTN:RTOS\r\n'.encode())
-        self.s.recv(1400)
+        # We also want the magnet to go to this setpoint, so send RTOS along with the setpoint
+        self._query_raw([self._SET_FSET_Y, b'%.6f\r\n' % float(val), self._RTOS_Y], 2)
+        self._invalidate()
 
     def write_fvalueZ(self, val):
-        cmd = 'SET:DEV:GRPZ:PSU:SIG:FSET:' + str(val) + '\r\n'
-        self.s.sendall(cmd.encode())
-        self.s.recv(1400)
-        # We also want the magnet to go to this setpoint, so
-        self.s.sendall('SET:DEV:GRPZ:PSU:ACTN:RTOS\r\n'.encode())
-        self.s.recv(1400)        
+        # We also want the magnet to go to this setpoint, so send RTOS along with the setpoint
+        self._query_raw([self._SET_FSET_Z, b'%.6f\r\n' % float(val), self._RTOS_Z], 2)
+        self._invalidate()
     
     def write_vector(self, val):
         if len(val) == 3:
-            self.write_fvalueX(val[0])
-            self.write_fvalueY(val[1])
-            self.write_fvalueZ(val[2])
+            parts = [self._SET_FSET_X, b'%.6f\r\n' % float(val[0]),
+                     self._SET_FSET_Y, b'%.6f\r\n' % float(val[1]),
+                     self._SET_FSET_Z, b'%.6f\r\n' % float(val[2]),
+                     self._RTOS_X, self._RTOS_Y, self._RTOS_Z]
+            self._query_raw(parts, 6)
+            self._invalidate()
     
+    @ttl_cache(seconds=SETTING_TTL)
     def read_rateX(self):
-        self.s.sendall('READ:DEV:GRPX:PSU:SIG:RFST\r\n'.encode())
-        resp = self.s.recv(1400).decode()
-        resp = float(resp.split(':')[-1].strip('T/m\n'))
+        if self._snapshot is not None:
+            return self._snapshot[1][0]
+        resp = self.query('READ:DEV:GRPX:PSU:SIG:RFST')
+        resp = _mercury.parse_num(resp)
         return resp
     
+    @ttl_cache(seconds=SETTING_TTL)
     def read_rateY(self):
-        self.s.sendall('READ:DEV:GRPY:PSU:SIG:RFST\r\n'.encode())
-        resp = self.s.recv(1400).decode()
-        resp = float(resp.split(':')[-1].strip('T/m\n'))
+        if self._snapshot is not None:
+            return self._snapshot[1][1]
+        resp = self.query('READ:DEV:GRPY:PSU:SIG:RFST')
+        resp = _mercury.parse_num(resp)
         return resp
     
+    @ttl_cache(seconds=SETTING_TTL)
     def read_rateZ(self):
-        self.s.sendall('READ:DEV:GRPZ:PSU:SIG:RFST\r\n'.encode())
-        resp = self.s.recv(1400).decode()
-        resp = float(resp.split(':')[-1].strip('T/m\n'))
+        if self._snapshot is not None:
+            return self._snapshot[1][2]
+        resp = self.query('READ:DEV:GRPZ:PSU:SIG:RFST')
+        resp = _mercury.parse_num(resp)
         return resp
     
     def read_rates(self):
-        rate_x = self.read_rateX()
-        rate_y = self.read_rateY()
-        rate_z = self.read_rateZ()
-        return [rate_x, rate_y, rate_z]
+        if self._snapshot is not None:
+            return list(self._snapshot[1])
+        resp = self._query_many(['READ:DEV:GRPX:PSU:SIG:RFST', 'READ:DEV:GRPY:PSU:SIG:RFST', 'READ:DEV:GRPZ:PSU:SIG:RFST'])
+        return [_mercury.parse_num(r) for r in resp]
     
     def write_rateX(self, val):
-        cmd = 'SET:DEV:GRPX:PSU:SIG:RFST:' + str(val) + '\r\n'
-        self.s.sendall(cmd.encode())
-        self.s.recv(1400)
+        self._cache.pop('read_rateX', None)
+        self._query_raw([self._SET_RFST_X, b'%.6f\r\n' % float(val)], 1)
+        self._invalidate()
         
     def write_rateY(self, val):
-        cmd = 'SET:DEV:GRPY:PSU:SIG:RFST:' + str(val) + '\r\n'
-        self.s.sendall(cmd.encode())
-        self.s.recv(1400)
+        self._cache.pop('read_rateY', None)
+        self._query_raw([self._SET_RFST_Y, b'%.6f\r\n' % float(val)], 1)
+        self._invalidate()
         
     def write_rateZ(self, val):
-        cmd = 'SET:DEV:GRPZ:PSU:SIG:RFST:' + str(val) + '\r\n'
-        self.s.sendall(cmd.encode())
-        self.s.recv(1400)
+        self._cache.pop('read_rateZ', None)
+        self._query_raw([self._SET_RFST_Z, b'%.6f\r\n' % float(val)], 1)
+        self._invalidate()
         
     def read_state(self):
         # Human-readable response of the magnet state
-        self.s.sendall('READ:DEV:GRPX:PSU:ACTN\r\n'.encode())
-        respX = self.s.recv(1400).decode().split(':')[-1].strip('\n')
-        self.s.sendall('READ:DEV:GRPY:PSU:ACTN\r\n'.encode())
-        respY = self.s.recv(1400).decode().split(':')[-1].strip('\n')
-        self.s.sendall('READ:DEV:GRPZ:PSU:ACTN\r\n'.encode())
-        respZ = self.s.recv(1400).decode().split(':')[-1].strip('\n')      
+        if self._snapshot is not None:
+            respX, respY, respZ = self._snapshot[2]
+        else:
+            resp = self._query_many(['READ:DEV:GRPX:PSU:ACTN', 'READ:DEV:GRPY:PSU:ACTN', 'READ:DEV:GRPZ:PSU:ACTN'])
+            respX, respY, respZ = [r.split(':')[-1] for r in resp]
         msg = '(X) : ' + respX + ', (Y) : ' + respY + ', (Z) : ' + respZ
         return msg
     
+    @ttl_cache(seconds=1.0)
     def read_temp(self):
-        self.s.sendall('READ:DEV:MB1.T1:TEMP:SIG:TEMP\r\n'.encode())
-        resp = self.s.recv(1400).decode()
-        resp = float(resp.split(':')[-1].strip('K\n'))
+        resp = self.query('READ:DEV:MB1.T1:TEMP:SIG:TEMP')
+        resp = _mercury.parse_num(resp)
         return resp
     
     def read_status(self):
         # Software response of the magnet state
-        self.s.sendall('READ:DEV:GRPX:PSU:ACTN\r\n'.encode())
-        respX = self.s.recv(1400).decode().split(':')[-1].strip('\n')
-        self.s.sendall('READ:DEV:GRPY:PSU:ACTN\r\n'.encode())
-        respY = self.s.recv(1400).decode().split(':')[-1].strip('\n')
-        self.s.sendall('READ:DEV:GRPZ:PSU:ACTN\r\n'.encode())
-        respZ = self.s.recv(1400).decode().split(':')[-1].strip('\n') 
+        if self._snapshot is not None:
+            respX, respY, respZ = self._snapshot[2]
+        else:
+            resp = self._query_many(['READ:DEV:GRPX:PSU:ACTN', 'READ:DEV:GRPY:PSU:ACTN', 'READ:DEV:GRPZ:PSU:ACTN'])
+            respX, respY, respZ = [r.split(':')[-1] for r in resp]
         if respX == 'HOLD' and respY == 'HOLD' and respZ == 'HOLD':
             return 'HOLD'
         if respX != 'HOLD' or respY != 'HOLD' or respZ != 'HOLD':
             return 'MOVING'
         
     def read_alarm(self):
-        self.s.sendall('READ:SYS:ALRM\r\n'.encode())
-        resp = self.s.recv(1400).decode()
+        resp = self.query('READ:SYS:ALRM')
         return resp
     
     def gotozero(self):
-        self.s.sendall('SET:DEV:GRPX:PSU:ACTN:RTOZ\r\n'.encode())
-        self.s.recv(1400)
-        self.s.sendall('SET:DEV:GRPY:PSU:ACTN:RTOZ\r\n'.encode())
-        self.s.recv(1400)
-        self.s.sendall('SET:DEV:GRPZ:PSU:ACTN:RTOZ\r\n'.encode())
-        self.s.recv(1400)
+        self._query_many(['SET:DEV:GRPX:PSU:ACTN:RTOZ', 'SET:DEV:GRPY:PSU:ACTN:RTOZ', 'SET:DEV:GRPZ:PSU:ACTN:RTOZ'])
+        self._invalidate()
         
     def clamp(self):
-        self.s.sendall('SET:DEV:GRPX:PSU:ACTN:CLMP\r\n'.encode())
-        self.s.recv(1400)
-        self.s.sendall('SET:DEV:GRPY:PSU:ACTN:CLMP\r\n'.encode())
-        self.s.recv(1400)
-        self.s.sendall('SET:DEV:GRPZ:PSU:ACTN:CLMP\r\n'.encode())
-        self.s.recv(1400)   
+        self._query_many(['SET:DEV:GRPX:PSU:ACTN:CLMP', 'SET:DEV:GRPY:PSU:ACTN:CLMP', 'SET:DEV:GRPZ:PSU:ACTN:CLMP'])
+        self._invalidate()
         
     def hold(self):
-        self.s.sendall('SET:DEV:GRPX:PSU:ACTN:HOLD\r\n'.encode())
-        self.s.recv(1400)
-        self.s.sendall('SET:DEV:GRPY:PSU:ACTN:HOLD\r\n'.encode())
-        self.s.recv(1400)
-        self.s.sendall('SET:DEV:GRPZ:PSU:ACTN:HOLD\r\n'.encode())
-        self.s.recv(1400)        
+        self._query_many(['SET:DEV:GRPX:PSU:ACTN:HOLD', 'SET:DEV:GRPY:PSU:ACTN:HOLD', 'SET:DEV:GRPZ:PSU:ACTN:HOLD'])        
+        self._invalidate()
         
+
+class MercuryiPS_async:
+    """
+    Variant of the MercuryiPS class that uses asyncio for the TCP/IP connection.
+    The connection is served by an event loop in a background thread. The coroutines
+    (prefixed with 'a') can be awaited from any event loop, such that the transactions
+    of several instruments overlap, e.g.
+        x, y, z = asyncio.run(qtmlab.gather_reads(ips.aread_fvalueX(), ips.aread_fvalueY(), ips.aread_fvalueZ()))
+    The functions without prefix are synchronous wrappers with the usual API.
+    """
+    type = 'MercuryiPS'
+
+    def __init__(self, IPaddress, port=7020):
+        # Port should be a number, not a string
+        if not isinstance(port, int):
+            port = int(port)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self._sync(self._connect(IPaddress, port))
+
+    async def _connect(self, IPaddress, port):
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(IPaddress, port), _TIMEOUT)
+        self._lock = asyncio.Lock()
+
+    async def _query_many(self, cmds):
+        # Runs on the event loop of this instrument. Responses arrive in the order of the commands.
+        async with self._lock:
+            return await asyncio.wait_for(self._exchange(cmds), _TIMEOUT)
+
+    async def _exchange(self, cmds):
+        self.writer.write(('\r\n'.join(cmds) + '\r\n').encode())
+        await self.writer.drain()
+        return [(await self.reader.readuntil(b'\n')).decode().rstrip('\n') for cmd in cmds]
+
+    def _sync(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            # A little longer than _TIMEOUT, such that the timeout of the coroutine itself comes first
+            return future.result(_TIMEOUT + 1)
+        finally:
+            # Do not leave the coroutine running on the loop after a timeout (no-op when it is done)
+            future.cancel()
+
+    def close(self):
+        self.writer.close()
+        self._sync(self.writer.wait_closed())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    async def aquery_many(self, cmds):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._query_many(cmds), self.loop))
+
+    async def aquery(self, val):
+        return (await self.aquery_many([val]))[0]
+
+    async def aread_fvalueX(self):
+        resp = await self.aquery('READ:DEV:GRPX:PSU:SIG:FLD')
+        return _mercury.parse_num(resp)
+
+    async def aread_fvalueY(self):
+        resp = await self.aquery('READ:DEV:GRPY:PSU:SIG:FLD')
+        return _mercury.parse_num(resp)
+
+    async def aread_fvalueZ(self):
+        resp = await self.aquery('READ:DEV:GRPZ:PSU:SIG:FLD')
+        return _mercury.parse_num(resp)
+
+    async def aread_vector(self):
+        resp = await self.aquery_many(['READ:DEV:GRPX:PSU:SIG:FLD', 'READ:DEV:GRPY:PSU:SIG:FLD', 'READ:DEV:GRPZ:PSU:SIG:FLD'])
+        return [_mercury.parse_num(r) for r in resp]
+
+    async def awrite_fvalueX(self, val):
+        await self.aquery_many(['SET:DEV:GRPX:PSU:SIG:FSET:%.6f' % float(val), 'SET:DEV:GRPX:PSU:ACTN:RTOS'])
+
+    async def awrite_fvalueY(self, val):
+        await self.aquery_many(['SET:DEV:GRPY:PSU:SIG:FSET:%.6f' % float(val), 'SET:DEV:GRPY:PSU:ACTN:RTOS'])
+
+    async def awrite_fvalueZ(self, val):
+        await self.aquery_many(['SET:DEV:GRPZ:PSU:SIG:FSET:%.6f' % float(val), 'SET:DEV:GRPZ:PSU:ACTN:RTOS'])
+
+    async def aread_rates(self):
+        resp = await self.aquery_many(['READ:DEV:GRPX:PSU:SIG:RFST', 'READ:DEV:GRPY:PSU:SIG:RFST', 'READ:DEV:GRPZ:PSU:SIG:RFST'])
+        return [_mercury.parse_num(r) for r in resp]
+
+    async def aread_status(self):
+        resp = await self.aquery_many(['READ:DEV:GRPX:PSU:ACTN', 'READ:DEV:GRPY:PSU:ACTN', 'READ:DEV:GRPZ:PSU:ACTN'])
+        if all(r.split(':')[-1] == 'HOLD' for r in resp):
+            return 'HOLD'
+        return 'MOVING'
+
+    async def aread_temp(self):
+        resp = await self.aquery('READ:DEV:MB1.T1:TEMP:SIG:TEMP')
+        return _mercury.parse_num(resp)
+
+    def query(self, val):
+        return self._sync(self.aquery(val))
+
+    def read_fvalueX(self):
+        return self._sync(self.aread_fvalueX())
+
+    def read_fvalueY(self):
+        return self._sync(self.aread_fvalueY())
+
+    def read_fvalueZ(self):
+        return self._sync(self.aread_fvalueZ())
+
+    def read_vector(self):
+        return self._sync(self.aread_vector())
+
+    def write_fvalueX(self, val):
+        self._sync(self.awrite_fvalueX(val))
+
+    def write_fvalueY(self, val):
+        self._sync(self.awrite_fvalueY(val))
+
+    def write_fvalueZ(self, val):
+        self._sync(self.awrite_fvalueZ(val))
+
+    def read_rates(self):
+        return self._sync(self.aread_rates())
+
+    def read_status(self):
+        return self._sync(self.aread_status())
+
+    def read_temp(self):
+        return self._sync(self.aread_temp())
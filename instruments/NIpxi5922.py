@@ -15,11 +15,62 @@ daan@daanwielens.com
 import niscope
 import numpy as np
 
+# Maximum number of points per channel that get_wav_trig_avg fetches in one go
+DEFAULT_MAX_NPTS = int(1e6)
+
+class _AcqCtx:
+    '''
+    Context manager that keeps a configured niscope session open, such that
+    multiple acquisitions can be made without opening and configuring the
+    session each time. Use via NIpxi5922.acquiring().
+    '''
+    def __init__(self, PXIaddr, fs, npts, channel, trigger_level, trigger_coupling, trigger_slope):
+        self.PXIaddr = PXIaddr
+        self.fs = int(fs)
+        self.npts = int(npts)
+        self.trigger = (channel, trigger_level, trigger_coupling, trigger_slope)
+
+    def __enter__(self):
+        self.session = niscope.Session(self.PXIaddr)
+        # Configure channels
+        self.session.channels[0].configure_vertical(range=1.0, coupling=niscope.VerticalCoupling.DC)
+        self.session.channels[1].configure_vertical(range=1.0, coupling=niscope.VerticalCoupling.DC)
+        # Configure horizontal
+        self.session.configure_horizontal_timing(min_sample_rate=self.fs, min_num_pts=self.npts, ref_position=0, num_records=1, enforce_realtime=True)
+        # Set up trigger
+        self.session.configure_trigger_edge(*self.trigger)
+        # Reuse the same buffer for every fetch
+        self._buf = np.empty(self.npts*2, dtype=np.float64)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.session.close()
+
+    def fetch(self):
+        '''
+        Acquire one waveform. Note that the returned arrays are views on a buffer
+        that is overwritten by the next fetch, so copy them if they need to be kept.
+        '''
+        with self.session.initiate():
+            self.session.channels[0,1].fetch_into(self._buf, timeout=5.0)
+        return self._buf[:self.npts], self._buf[self.npts:]
+
 class NIpxi5922:
     type = 'NIpxi5922'
     
     def __init__(self, PXIaddr='Dev5'):
         self.PXIaddr = PXIaddr
+
+    def acquiring(self, fs, npts, channel='0', trigger_level=0, trigger_coupling=niscope.TriggerCoupling.DC, trigger_slope=niscope.TriggerSlope.POSITIVE):
+        '''
+        Open and configure a session once for many acquisitions. The scope is
+        'locked' until the with-block is left. Example:
+            with scope.acquiring(fs, npts) as acq:
+                for i in range(n):
+                    CH0, CH1 = acq.fetch()
+        The parameters are the same as for get_wav_trig.
+        '''
+        return _AcqCtx(self.PXIaddr, fs, npts, channel, trigger_level, trigger_coupling, trigger_slope)
         
     def get_wav_now(self, fs, npts):
         '''
@@ -53,10 +104,11 @@ class NIpxi5922:
             # Set up trigger
             session.configure_trigger_edge('0', 0, niscope.TriggerCoupling.DC, niscope.TriggerSlope.POSITIVE)
             with session.initiate():
-                waveform = np.ndarray(npts*2, dtype=np.float64)
+                # Fetch both channels into one new array; CH0 and CH1 are views on it
+                waveform = np.empty(npts*2, dtype=np.float64)
                 session.channels[0,1].fetch_into(waveform, timeout=5.0)
                 CH0 = waveform[:npts]
-                CH1 = waveform[npts:]            
+                CH1 = waveform[npts:]
         return CH0, CH1   
     
     def get_wav_trig(self, fs, npts, channel='0', trigger_level=0, trigger_coupling=niscope.TriggerCoupling.DC, trigger_slope=niscope.TriggerSlope.POSITIVE):
@@ -99,16 +151,19 @@ class NIpxi5922:
             # Set up trigger
             session.configure_trigger_edge(channel, trigger_level, trigger_coupling, trigger_slope)
             with session.initiate():
-                waveform = np.ndarray(npts*2, dtype=np.float64)
+                # Fetch both channels into one new array; CH0 and CH1 are views on it
+                waveform = np.empty(npts*2, dtype=np.float64)
                 session.channels[0,1].fetch_into(waveform, timeout=5.0)
                 CH0 = waveform[:npts]
-                CH1 = waveform[npts:]            
+                CH1 = waveform[npts:]
         return CH0, CH1 
     
-    def get_wav_trig_avg(self, fs, npts, navg, channel='0', trigger_level=0, trigger_coupling=niscope.TriggerCoupling.DC, trigger_slope=niscope.TriggerSlope.POSITIVE):
+    def get_wav_trig_avg(self, fs, npts, navg, channel='0', trigger_level=0, trigger_coupling=niscope.TriggerCoupling.DC, trigger_slope=niscope.TriggerSlope.POSITIVE, binary=False):
         '''
         Get triggered (edge type) readings from the PXI-5922 digitizer. The data
         is collected <navg> times and a np.mean of the data is then returned.
+        The averages are acquired as multiple records, so the trigger is re-armed
+        by the hardware in between.
         
         (This is a workaround to get averaging functionality)
 
@@ -128,6 +183,9 @@ class NIpxi5922:
             The trigger coupling. Normally set to niscope.TriggerCoupling.DC
         trigger_slope : niscope.TriggerSlope type
             Specifies whether a rising or falling edge should be used. Normally set to niscope.TriggerSlope.POSITIVE
+        binary : Bool
+            Fetch the raw int32 samples instead of float64 voltages, which halves the data
+            that is moved per sample. The samples are scaled to volts while averaging.
 
         Returns
         -------
@@ -140,29 +198,46 @@ class NIpxi5922:
         # Inputs must be integers
         fs = int(fs)
         npts = int(npts)
+        navg = int(navg)
+        dtype = np.int32 if binary else np.float64
         # Open session only in function definition, so that scope is only 'locked' during acquisition (afterwards, NI InstrumentStudio / Soft Front Panel can take over)
         with niscope.Session(self.PXIaddr) as session:
             # Configure channels
             session.channels[0].configure_vertical(range=1.0, coupling=niscope.VerticalCoupling.DC)
             session.channels[1].configure_vertical(range=1.0, coupling=niscope.VerticalCoupling.DC)
-            # Configure horizontal
-            session.configure_horizontal_timing(min_sample_rate=fs, min_num_pts=npts, ref_position=0, num_records=1, enforce_realtime=True)     
             # Set up trigger
             session.configure_trigger_edge(channel, trigger_level, trigger_coupling, trigger_slope)
-            CH0_list = np.array([], dtype=np.float64)
-            CH1_list = np.array([], dtype=np.float64)
-            for i in range(navg):
+            # Keep a running sum instead of all acquisitions, so memory use does not grow with navg
+            CH0_sum = np.zeros(npts, dtype=np.float64)
+            CH1_sum = np.zeros(npts, dtype=np.float64)
+            # Acquire the averages as multiple records (one trigger each) per initiate, such that the
+            # digitizer re-arms the trigger between records by itself, and fetch them in one call.
+            # The number of records per acquisition is limited, such that they fit in the onboard memory.
+            nrec_max = max(1, DEFAULT_MAX_NPTS // npts)
+            nrec_conf = None
+            # One fetch buffer for the largest block, reused for every block of this call
+            wavbuf = np.empty(2*npts*min(nrec_max, navg), dtype=dtype)
+            done = 0
+            while done < navg:
+                nrec = min(nrec_max, navg - done)
+                if nrec != nrec_conf:
+                    session.configure_horizontal_timing(min_sample_rate=fs, min_num_pts=npts, ref_position=0, num_records=nrec, enforce_realtime=True)
+                    nrec_conf = nrec
+                waveform = wavbuf[:2*npts*nrec]
                 with session.initiate():
-                    waveform = np.ndarray(npts*2, dtype=np.float64)
-                    session.channels[0,1].fetch_into(waveform, timeout=5.0)
-                    if len(CH0_list) == 0:
-                        CH0_list = waveform[:npts]
-                        CH1_list = waveform[npts:]
-                    else:
-                        CH0_list = np.vstack((CH0_list, waveform[:npts]))
-                        CH1_list = np.vstack((CH1_list, waveform[npts:]))           
+                    infos = session.channels[0,1].fetch_into(waveform, num_records=nrec, timeout=5.0*nrec)
+                # The data holds all records of channel 0, followed by all records of channel 1
+                records = waveform.reshape(2, nrec, npts)
+                if binary:
+                    # Scale with the gain and offset of each channel, sum in float64 to keep the resolution
+                    CH0_sum += records[0].sum(axis=0, dtype=np.float64) * infos[0].gain + nrec * infos[0].offset
+                    CH1_sum += records[1].sum(axis=0, dtype=np.float64) * infos[nrec].gain + nrec * infos[nrec].offset
+                else:
+                    CH0_sum += records[0].sum(axis=0)
+                    CH1_sum += records[1].sum(axis=0)
+                done += nrec
         
-        CH0 = np.mean(CH0_list, 0)
-        CH1 = np.mean(CH1_list, 0)
+        CH0 = CH0_sum / navg
+        CH1 = CH1_sum / navg
         return CH0, CH1
     
\ No newline at end of file
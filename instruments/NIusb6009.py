@@ -16,52 +16,117 @@ import nidaqmx
 class NIusb6009:
     type = 'NI USB-6009'
 
-    def __init__(self, DEVname='Dev1'):
+    def __init__(self, DEVname='Dev1', persistent=False):
         self.DEVname = DEVname
         self.ao0_out = 0
         self.ao1_out = 0
+        # Whether ao0 / ao1 were set by us, see _ao_pair_known()
+        self._ao_set = [False, False]
+        # With persistent=True, one AI task (ai0:3) and one AO task (ao0:1) are kept open instead of
+        # creating a new task on every call. This removes the task setup from each read/write, but the
+        # device stays reserved until close() is called. The tasks are created on first use, see
+        # _get_ai_task() and _get_ao_task().
+        self._persistent = persistent
+        self._ai_task = None
+        self._ao_task = None
+
+    def _get_ai_task(self):
+        # The USB-6009 can only run one AI task at a time, so all AI channels share a single task
+        if self._ai_task is None:
+            self._ai_task = nidaqmx.Task()
+            self._ai_task.ai_channels.add_ai_voltage_chan(self.DEVname + r'/ai0:3')
+            self._ai_task.start()
+        return self._ai_task
+
+    def _get_ao_task(self):
+        if self._ao_task is None:
+            self._ao_task = nidaqmx.Task()
+            self._ao_task.ao_channels.add_ao_voltage_chan(self.DEVname + r'/ao0:1', min_val = 0, max_val = 5)
+            self._ao_task.start()
+        return self._ao_task
+
+    def _ao_pair_known(self):
+        # The persistent AO task always writes both outputs. The USB-6009 cannot read back its
+        # outputs, so it is only used once both were set by us; until then, each output is
+        # written with its own task, such that the other output keeps its voltage.
+        return self._persistent and all(self._ao_set)
+
+    def close(self):
+        # Release the device. Persistent tasks are created again on the next read/write.
+        if self._ai_task is not None:
+            self._ai_task.close()
+            self._ai_task = None
+        if self._ao_task is not None:
+            self._ao_task.close()
+            self._ao_task = None
+
+    def read_ai_all(self):
+        # Read ai0 - ai3 with a single task
+        if self._persistent:
+            return self._get_ai_task().read()
+        with nidaqmx.Task() as task:
+            task.ai_channels.add_ai_voltage_chan(self.DEVname + r'/ai0:3')
+            return task.read()
     
     def read_ai0(self):
         # Differential input: 14 bit resolution, [-10, 10 V] --> 1.22 mV
+        if self._persistent:
+            return self._get_ai_task().read()[0]
         with nidaqmx.Task() as task:
             task.ai_channels.add_ai_voltage_chan(self.DEVname + r'/ai0')
             return task.read()
 
     def read_ai1(self):
+        if self._persistent:
+            return self._get_ai_task().read()[1]
         with nidaqmx.Task() as task:
             task.ai_channels.add_ai_voltage_chan(self.DEVname + r'/ai1')
             return task.read()
 
     def read_ai2(self):
+        if self._persistent:
+            return self._get_ai_task().read()[2]
         with nidaqmx.Task() as task:
             task.ai_channels.add_ai_voltage_chan(self.DEVname + r'/ai2')
             return task.read()
         
     def read_ai3(self):
+        if self._persistent:
+            return self._get_ai_task().read()[3]
         with nidaqmx.Task() as task:
             task.ai_channels.add_ai_voltage_chan(self.DEVname + r'/ai3')
             return task.read()
 
     def write_ao0(self, val):
+        if self._ao_pair_known():
+            self._get_ao_task().write([val, self.ao1_out])
+            self.ao0_out = val
+            return
         with nidaqmx.Task() as task:
             task.ao_channels.add_ao_voltage_chan(self.DEVname + r'/ao0', min_val = 0, max_val = 5)
             task.write(val)
             task.wait_until_done()
             task.stop()
             self.ao0_out = val
+            self._ao_set[0] = True
             
     def read_ao0(self):
         # Note: this function returns the setpoint, since we can't measure the actual output voltage!
         return self.ao0_out
     
     def write_ao1(self, val):
+        if self._ao_pair_known():
+            self._get_ao_task().write([self.ao0_out, val])
+            self.ao1_out = val
+            return
         with nidaqmx.Task() as task:
             task.ao_channels.add_ao_voltage_chan(self.DEVname + r'/ao1', min_val = 0, max_val = 5)
             task.write(val)
             task.wait_until_done()
             task.stop()
             self.ao1_out = val
+            self._ao_set[1] = True
             
     def read_ao1(self):
         # Note: this function returns the setpoint, since we can't measure the actual output voltage!
-        return self.ao1_out
\ No newline at end of file
+        return self.ao1_out
@@ -9,7 +9,8 @@ University of Twente
 daan@daanwielens.com
 """
 
-import pyvisa as visa
+from . import _visa
+from ._cache import ttl_cache, Memoized
 
 class WrongInstrErr(Exception):
     """
@@ -19,18 +20,22 @@ class WrongInstrErr(Exception):
     """
     pass
 
-class TekAFG1022:
+class TekAFG1022(Memoized):
     type = 'Tektronix AFG1022'
 
     def __init__(self, USBaddr='0x0699::0x0353::1525453'):
-        rm = visa.ResourceManager()
-        self.visa = rm.open_resource('USB0::{}::INSTR'.format(USBaddr))
+        self.visa = _visa.get_rm().open_resource('USB0::{}::INSTR'.format(USBaddr))
+        self.visa.timeout = 2000
+        self.visa.read_termination = '\n'
+        self.visa.write_termination = '\n'
+        self._init_cache()
         # Check if device is really a Tektronix AFG1022
         resp = self.visa.query('*IDN?')
         model = resp.split(',')[1]
         if model != 'AFG1022':
             raise WrongInstrErr('Expected Tektronix AFG1022, got {}'.format(resp))
 
+    @ttl_cache(seconds=float('inf'))
     def get_iden(self):
         resp = str(self.visa.query('*IDN?'))
         return resp
@@ -44,7 +49,7 @@ class TekAFG1022:
 
     def write_amp(self, val):
         val = float(val)
-        self.visa.write('SOUR1:VOLT ' + str(val) + '\n')
+        self.visa.write('SOUR1:VOLT ' + str(val))
 
     def read_dcv(self):
         resp = float(self.visa.query('SOUR1:VOLT:OFFSET?').replace('V', ''))
@@ -52,7 +57,7 @@ class TekAFG1022:
 
     def write_dcv(self, val):
         val = float(val)
-        self.visa.write('SOUR1:VOLT:OFFSET ' + str(val) + '\n')
+        self.visa.write('SOUR1:VOLT:OFFSET ' + str(val))
 
     def read_freq(self):
         resp = float(self.visa.query('SOUR1:FREQ?'))
@@ -60,25 +65,25 @@ class TekAFG1022:
 
     def write_freq(self, val):
         val = float(val)
-        self.visa.write('SOUR1:FREQ ' + str(val) + '\n')
+        self.visa.write('SOUR1:FREQ ' + str(val))
 
     def read_waveform(self):
-        resp = self.visa.query('SOUR1:FUNC?').strip('\n')
+        resp = self.visa.query('SOUR1:FUNC?')
         return resp
 
     def write_waveform(self, val):
         val = val.upper()
         if val in ['SIN', 'SQU', 'PULS', 'RAMP', 'PRN']:
-            self.visa.write('SOUR1:FUNC ' + str(val) + '\n')
+            self.visa.write('SOUR1:FUNC ' + str(val))
         else:
             print('Warning! Function type not recognised.')
 
     def read_output(self):
-        resp = self.visa.query('OUTP1?').strip('\n')
+        resp = self.visa.query('OUTP1?')
         return resp
 
     def write_output(self, val):
         if val in ['ON', 'on', 1]:
-            self.visa.write('OUTP1 ON\n')
+            self.visa.write('OUTP1 ON')
         if val in ['OFF', 'off', 0]:
-            self.visa.write('OUTP1 OFF\n')
+            self.visa.write('OUTP1 OFF')
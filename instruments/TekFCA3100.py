@@ -9,10 +9,23 @@ University of Twente
 daan@daanwielens.com
 """
 
-import visa
+from . import _visa
 import time
+import numpy as np
 from scipy import stats
 
+def _read_func(cmd, cast=str):
+    # Create a read function for a fixed query command, whose response is converted with cast
+    def read(self):
+        return cast(self.visa.query(cmd))
+    return read
+
+def _write_func(prefix):
+    # Create a write function that sends prefix + value
+    def write(self, val):
+        self.visa.write(prefix + str(val))
+    return write
+
 class WrongInstrErr(Exception):
     """
     A connection was established to the instrument, but the instrument
@@ -25,7 +38,7 @@ class TekFCA3100:
     type = 'TekFCA3100'
 
     def __init__(self, GPIBaddr):
-        rm = visa.ResourceManager()
+        rm = _visa.get_rm()
         self.visa = rm.open_resource('GPIB0::{}::INSTR'.format(GPIBaddr))
         # Check if device is really a Agilent E8241A series
         resp = self.visa.query('*IDN?')
@@ -33,13 +46,18 @@ class TekFCA3100:
         if not 'FCA3100' in model:
             raise WrongInstrErr('Expected Tektronix FCA3100 series, got {}'.format(resp))
         self.visa.timeout = 10000
+        self.visa.chunk_size = 1024*1024
+        self.visa.query_delay = 0.0
+        self.visa.read_termination = '\n'
+        self.visa.write_termination = '\n'
+        # The identification does not change, so keep the response of the check above
+        self._idn = str(resp)
 
     def get_iden(self):
-        resp = str(self.visa.query('*IDN?'))
-        return resp
+        return self._idn
     
     def query(self, val):
-        resp = self.visa.query(val).strip('\n')
+        resp = self.visa.query(val)
         return resp
     
     def write(self, val):
@@ -50,79 +68,49 @@ class TekFCA3100:
         
     def read_tint(self):
         # Read value without reprogramming the instrument settings
-        resp = self.visa.query('READ?').strip('\n')
+        resp = self.visa.query('READ?')
         return float(resp)
 
+    def fetch_tint_block(self, n):
+        # Let the counter take n measurements and read them all in one go, which is much
+        # faster than n calls to read_tint. Increase self.visa.timeout if the n measurements
+        # take longer than the timeout (10 s).
+        self.visa.write('TRIG:COUN ' + str(int(n)))
+        try:
+            resp = self.visa.query('READ?')
+        finally:
+            # read_tint expects a single measurement per READ?
+            self.visa.write('TRIG:COUN 1')
+        return np.fromstring(resp, sep=',')
+
 # Read instrument settings ----------------------------------------------------
-    def read_inpcoup1(self):
-        # Reads whether input coupling 1 is AC or DC
-        resp = self.visa.query('INP1:COUP?')
-        return resp.strip('\n')
-
-    def read_inpcoup2(self):
-        # Reads whether input coupling 1 is AC or DC
-        resp = self.visa.query('INP2:COUP?')
-        return resp.strip('\n')    
-    
-    def read_inpatt1(self):
-        # Reads whether input attenuation 1 is 1 or 10
-        resp = self.visa.query('INP1:ATT?')
-        return float(resp.strip('\n'))
-
-    def read_inpatt2(self):
-        # Reads whether input attenuation 2 is 1 or 10
-        resp = self.visa.query('INP2:ATT?')
-        return float(resp.strip('\n'))
-    
-    def read_inpimp1(self):
-        # Reads whether input impedance 1 is 50 or 1E6 [Ohm]
-        resp = self.visa.query('INP1:IMP?')
-        return float(resp.strip('\n'))
-
-    def read_inpimp2(self):
-        # Reads whether input impedance 2 is 50 or 1E6
-        resp = self.visa.query('INP2:IMP?')
-        return float(resp.strip('\n'))  
-    
-    def read_inplvl1(self):
-        # Reads the input 1 trigger level [Volt] when in MAN mode
-        resp = self.visa.query('INP1:LEV?')
-        return float(resp.strip('\n'))
-
-    def read_inplvl2(self):
-        # Reads the input 2 trigger level [Volt] when in MAN mode
-        resp = self.visa.query('INP2:LEV?')
-        return float(resp.strip('\n'))   
-    
-    def read_inplvlrel1(self):
-        # Reads the input 1 trigger level [%] when in AUTO mode
-        resp = self.visa.query('INP1:LEV:REL?')
-        return float(resp.strip('\n'))
-
-    def read_inplvlrel2(self):
-        # Reads the input 2 trigger level [%] when in AUTO mode
-        resp = self.visa.query('INP2:LEV:REL?')
-        return float(resp.strip('\n'))  
-    
-    def read_inpauto1(self):
-        # Reads the input 1 trigger type which is AUTO or MAN
-        resp = self.visa.query('INP1:LEV:AUTO?')
-        return float(resp.strip('\n'))
-
-    def read_inpauto2(self):
-        # Reads the input 2 trigger type which is AUTO or MAN
-        resp = self.visa.query('INP2:LEV:AUTO?')
-        return float(resp.strip('\n')) 
-    
-    def read_inpslop1(self):
-        # Reads the input 1 trigger slope type which is POS or NEG
-        resp = self.visa.query('INP1:SLOP?')
-        return resp.strip('\n')
-
-    def read_inpslop2(self):
-        # Reads the input 1 trigger slope type which is POS or NEG
-        resp = self.visa.query('INP2:SLOP?')
-        return resp.strip('\n')
+    # Reads whether input coupling 1/2 is AC or DC
+    read_inpcoup1 = _read_func('INP1:COUP?')
+    read_inpcoup2 = _read_func('INP2:COUP?')
+
+    # Reads whether input attenuation 1/2 is 1 or 10
+    read_inpatt1 = _read_func('INP1:ATT?', float)
+    read_inpatt2 = _read_func('INP2:ATT?', float)
+
+    # Reads whether input impedance 1/2 is 50 or 1E6 [Ohm]
+    read_inpimp1 = _read_func('INP1:IMP?', float)
+    read_inpimp2 = _read_func('INP2:IMP?', float)
+
+    # Reads the input 1/2 trigger level [Volt] when in MAN mode
+    read_inplvl1 = _read_func('INP1:LEV?', float)
+    read_inplvl2 = _read_func('INP2:LEV?', float)
+
+    # Reads the input 1/2 trigger level [%] when in AUTO mode
+    read_inplvlrel1 = _read_func('INP1:LEV:REL?', float)
+    read_inplvlrel2 = _read_func('INP2:LEV:REL?', float)
+
+    # Reads the input 1/2 trigger type which is AUTO or MAN
+    read_inpauto1 = _read_func('INP1:LEV:AUTO?', float)
+    read_inpauto2 = _read_func('INP2:LEV:AUTO?', float)
+
+    # Reads the input 1/2 trigger slope type which is POS or NEG
+    read_inpslop1 = _read_func('INP1:SLOP?')
+    read_inpslop2 = _read_func('INP2:SLOP?')
     
     def status1(self):
         print(self.read_inpcoup1())
@@ -134,53 +122,32 @@ class TekFCA3100:
     
 # Write instrument settings ---------------------------------------------------
     # Valid options: AC , DC
-    def write_inpcoup1(self, val):
-        self.visa.write('INP1:COUP ' + val)
-        
-    def write_inpcoup2(self, val):
-        self.visa.write('INP2:COUP ' + val)
+    write_inpcoup1 = _write_func('INP1:COUP ')
+    write_inpcoup2 = _write_func('INP2:COUP ')
     
     # Valid options: 1, 10
-    def write_inpatt1(self, val):
-        self.visa.write('INP1:ATT ' + str(val))
-
-    def write_inpatt2(self, val):
-        self.visa.write('INP2:ATT ' + str(val))
+    write_inpatt1 = _write_func('INP1:ATT ')
+    write_inpatt2 = _write_func('INP2:ATT ')
     
     # Valid options: 50, 1E6
-    def write_inpimp1(self, val):
-        self.visa.write('INP1:IMP ' + str(val))
-
-    def write_inpimp2(self, val):
-        self.visa.write('INP2:IMP ' + str(val))
+    write_inpimp1 = _write_func('INP1:IMP ')
+    write_inpimp2 = _write_func('INP2:IMP ')
     
     # Valid options: decimal number between -5 and 5 V in steps of 2.5 mV (for attenuation 1x) or -50 V and 50 V in steps of 25 mV (10x attenuation)
-    def write_inplvl1(self, val):
-        self.visa.write('INP1:LEV ' + str(val))
-
-    def write_inplvl2(self, val):
-        self.visa.write('INP2:LEV ' + str(val))
+    write_inplvl1 = _write_func('INP1:LEV ')
+    write_inplvl2 = _write_func('INP2:LEV ')
     
     # Valid options: percentage between 0 and 100
-    def write_inplvlrel1(self, val):
-        self.visa.write('INP1:LEV:REL ' + str(val))
-
-    def write_inplvlrel2(self, val):
-        self.visa.write('INP2:LEV:REL ' + str(val))
+    write_inplvlrel1 = _write_func('INP1:LEV:REL ')
+    write_inplvlrel2 = _write_func('INP2:LEV:REL ')
     
     # Valid options: 1 or 0
-    def write_inpauto1(self, val):
-        self.visa.write('INP1:LEV:AUTO ' + str(val))
-
-    def write_inpauto2(self, val):
-        self.visa.write('INP2:LEV:AUTO ' + str(val))
+    write_inpauto1 = _write_func('INP1:LEV:AUTO ')
+    write_inpauto2 = _write_func('INP2:LEV:AUTO ')
     
     # Valid options: POS or NEG
-    def write_inpslop1(self, val):
-        self.visa.write('INP1:SLOP ' + val)
-
-    def write_inpslop2(self, val):
-        self.visa.write('INP2:SLOP ' + val)
+    write_inpslop1 = _write_func('INP1:SLOP ')
+    write_inpslop2 = _write_func('INP2:SLOP ')
         
     def write_conf(self, val):
         self.visa.write('CONF:' + val)
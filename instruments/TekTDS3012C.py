@@ -10,10 +10,13 @@ daan@daanwielens.com
 """
 
 
-import pyvisa as visa
+from . import _visa
 import numpy as np
 import ast
-from struct import unpack
+import collections
+
+# Waveform preamble fields used to convert the curve data, see get_pre1/get_pre2
+Pre = collections.namedtuple('Pre', 'ymult yzero yoff xinc')
 
 class WrongInstrErr(Exception):
     """
@@ -27,17 +30,36 @@ class TekTDS3012C:
     type = 'Tektronix TDS 3012C'
 
     def __init__(self, GPIBaddr):
-        rm = visa.ResourceManager()
+        rm = _visa.get_rm()
         self.visa = rm.open_resource('GPIB0::{}::INSTR'.format(GPIBaddr))
         # Check if device is really a Tektronix AFG1022
         resp = self.visa.query('*IDN?')
         model = resp.split(',')[1]
         if 'TDS 3012' not in model:
             raise WrongInstrErr('Expected Tektronix TDS 3012 series, got {}'.format(resp))
+        # Read a full waveform (up to 20000 bytes) in one go
+        self.visa.chunk_size = 1024*1024
+        self.visa.query_delay = 0.0
+        self.visa.read_termination = '\n'
+        self.visa.write_termination = '\n'
+        # Cached identification and settings, such that get_wav* does not query them every time
+        self._idn = str(resp)
+        self._pre_ch1 = None
+        self._pre_ch2 = None
+        self._npts = None
+        self._active_source = None
+        # Time axes by (npts, xinc), see _time_axis
+        self._t_cache = {}
+
+    def clear_cache(self):
+        # Call this after settings were changed on the front panel or with write()
+        self._pre_ch1 = None
+        self._pre_ch2 = None
+        self._npts = None
+        self._active_source = None
 
     def get_iden(self):
-        resp = str(self.visa.query('*IDN?'))
-        return resp
+        return self._idn
 
     def close(self):
         self.visa.close()
@@ -72,118 +94,145 @@ class TekTDS3012C:
     # Divider settings
     def write_horzdiv(self, val):
         val = float(val)
-        self.write('HOR:MAI:SCA ' + str(val) + '\n')
+        self._pre_ch1 = None
+        self._pre_ch2 = None
+        self._t_cache.clear()
+        self.write('HOR:MAI:SCA ' + str(val))
 
     def write_vertdiv1(self, val):
         val = float(val)
-        self.write('CH1:SCA ' + str(val) + '\n')
+        self._pre_ch1 = None
+        self.write('CH1:SCA ' + str(val))
 
     def write_vertdiv2(self, val):
         val = float(val)
-        self.write('CH2:SCA ' + str(val) + '\n')
+        self._pre_ch2 = None
+        self.write('CH2:SCA ' + str(val))
 
     def read_horzdiv(self):
-        return float(self.query('HOR:MAI:SCA?').strip('\n'))
+        return float(self.query('HOR:MAI:SCA?'))
     
     def read_vertdiv1(self):
-        return float(self.query('CH1:SCA?').strip('\n'))
+        return float(self.query('CH1:SCA?'))
     
     def read_vertdiv2(self):
-        return float(self.query('CH2:SCA?').strip('\n'))
+        return float(self.query('CH2:SCA?'))
     
     def write_singleseq(self):
         # Simulates button press of SINGLE/SEQ button
-        self.write('FPANEL:PRESS SINGLESEQ\n')
+        self.write('FPANEL:PRESS SINGLESEQ')
     
+    def _select_source(self, val):
+        # Only send DATA:SOU when the source changes
+        if self._active_source != val:
+            self.write('DATA:SOU ' + val)
+            self._active_source = val
+
     # Preamble acquisition
     def get_pre1(self):
-        self.write('DATA:SOU CH1')
-        data = self.query('WFMP?').split(';')
-        ymult = float(data[12])
-        yzero = float(data[13])
-        yoff = float(data[14])
-        xinc = float(data[8])
-        return ymult, yzero, yoff, xinc
+        self._select_source('CH1')
+        if self._pre_ch1 is None:
+            data = self.query('WFMP?').split(';')
+            ymult = float(data[12])
+            yzero = float(data[13])
+            yoff = float(data[14])
+            xinc = float(data[8])
+            self._pre_ch1 = Pre(ymult, yzero, yoff, xinc)
+        return self._pre_ch1
         
     def get_pre2(self):
-        self.write('DATA:SOU CH2')
-        data = self.query('WFMP?').split(';')
-        ymult = float(data[12])
-        yzero = float(data[13])
-        yoff = float(data[14])
-        xinc = float(data[8])
-        return ymult, yzero, yoff, xinc   
+        self._select_source('CH2')
+        if self._pre_ch2 is None:
+            data = self.query('WFMP?').split(';')
+            ymult = float(data[12])
+            yzero = float(data[13])
+            yoff = float(data[14])
+            xinc = float(data[8])
+            self._pre_ch2 = Pre(ymult, yzero, yoff, xinc)
+        return self._pre_ch2
     
     # Get number of points (horizontal resolution)
     def read_npts1(self):
-        self.write('DATA:SOU CH1')
-        return int(self.query('WFMP:NR_Pt?'))
+        self._select_source('CH1')
+        if self._npts is None:
+            self._npts = int(self.query('WFMP:NR_Pt?'))
+        return self._npts
         
     def read_npts2(self):
-        self.write('DATA:SOU CH1')
-        return int(self.query('WFMP:NR_Pt?'))
+        self._select_source('CH2')
+        if self._npts is None:
+            self._npts = int(self.query('WFMP:NR_Pt?'))
+        return self._npts
     
     def write_npts(self, val):
         if val in [500, 10000]:
             self.write('HOR:RECO ' + str(val))
+            # The data width (and thereby the preamble) depends on the number of points
+            self._npts = val
+            self._pre_ch1 = None
+            self._pre_ch2 = None
         else:
             raise ValueError('The number of points can either be 500 or 10000.')
             
+    def _to_volts(self, ADCwave, pre):
+        # V = (ADCwave - yoff) * ymult + yzero, computed in place in a single float32 array
+        # (the scope digitizes with 9 bits, so float32 is more than precise enough)
+        V = np.empty(len(ADCwave), dtype=np.float32)
+        np.subtract(ADCwave, pre.yoff, out=V, dtype=np.float32)
+        V *= pre.ymult
+        V += pre.yzero
+        return V
+
+    def _time_axis(self, npts, xinc):
+        # The time axis only depends on npts and xinc, so reuse it between acquisitions.
+        # It is shared, hence read-only.
+        key = (npts, xinc)
+        t = self._t_cache.get(key)
+        if t is None:
+            t = np.arange(npts, dtype=np.float64) * xinc
+            t.flags.writeable = False
+            self._t_cache[key] = t
+        return t
+
     # Get waveform
     def get_wav1(self):
-        self.write('DATA:SOU CH1')
+        self._select_source('CH1')
         # If 500 data points are chosen, the scope does 'fast trigger' / 1 bit data (256 bins)
         if self.read_npts1() == 500:
             self.write('DATA:WIDTH 1')
-            self.write('DATA:ENC RPB') # Requires %sB for unpack
+            self.write('DATA:ENC RPB') # Unsigned 8 bit
             pre = self.get_pre1()
-            self.write('CURVE?')
-            data = self.visa.read_raw()
-             
-            headerlen = 5 # We expect the header to be '#3500' (#, 3 bytes required to print the number 500, 500 itself; 1 bits per data point)
-            ADCwave = data[headerlen:-1]
-            ADCwave = np.array(unpack('%sB' % len(ADCwave), ADCwave))    
+            # pyvisa parses the '#<n><len>' block header of the response
+            ADCwave = self.visa.query_binary_values('CURVE?', datatype='B', container=np.ndarray)
         # If 10000 points are chosen ('normal'), we get 2 bit data (65536 bins)
         else:
             self.write('DATA:WIDTH 2')
-            self.write('DATA:ENC SRP') # Requires %sH for unpack
+            self.write('DATA:ENC SRP') # Unsigned 16 bit, LSB first
             pre = self.get_pre1()
-            self.write('CURVE?')
-            data = self.visa.read_raw()
-
-            headerlen = 7 # '#520000' (#, 4 bytes for 10000*2, 20000 itself; 2 bits per data point)
-            ADCwave = data[headerlen:-1]
-            ADCwave = np.array(unpack('%sH' % int(len(ADCwave)/2), ADCwave))
+            # pyvisa parses the '#<n><len>' block header of the response
+            ADCwave = self.visa.query_binary_values('CURVE?', datatype='H', is_big_endian=False, container=np.ndarray)
          
-        V = (ADCwave - pre[2]) * pre[0] + pre[1]
-        t = np.arange(0, pre[3] * len(V), pre[3])
+        V = self._to_volts(ADCwave, pre)
+        t = self._time_axis(len(V), pre.xinc)
         return t, V       
      
     def get_wav2(self):
-        self.write('DATA:SOU CH2')
+        self._select_source('CH2')
         # If 500 data points are chosen, the scope does 'fast trigger' / 1 bit data (256 bins)
-        if self.read_npts1() == 500:
+        if self.read_npts2() == 500:
             self.write('DATA:WIDTH 1')
-            self.write('DATA:ENC RPB') # Requires %sB for unpack
+            self.write('DATA:ENC RPB') # Unsigned 8 bit
             pre = self.get_pre2()
-            self.write('CURVE?')
-            data = self.visa.read_raw()
-             
-            headerlen = 5 # We expect the header to be '#3500' (#, 3 bytes required to print the number 500, 500 itself; 1 bits per data point)
-            ADCwave = data[headerlen:-1]
-            ADCwave = np.array(unpack('%sB' % len(ADCwave), ADCwave))    
+            # pyvisa parses the '#<n><len>' block header of the response
+            ADCwave = self.visa.query_binary_values('CURVE?', datatype='B', container=np.ndarray)
         # If 10000 points are chosen ('normal'), we get 2 bit data (65536 bins)
         else:
             self.write('DATA:WIDTH 2')
-            self.write('DATA:ENC SRP') # Requires %sH for unpack
+            self.write('DATA:ENC SRP') # Unsigned 16 bit, LSB first
             pre = self.get_pre2()
-            self.write('CURVE?')
-            data = self.visa.read_raw()
-
-            headerlen = 7 # '#520000' (#, 4 bytes for 10000*2, 20000 itself; 2 bits per data point)
-            ADCwave = data[headerlen:-1]
-            ADCwave = np.array(unpack('%sH' % int(len(ADCwave)/2), ADCwave))
+            # pyvisa parses the '#<n><len>' block header of the response
+            ADCwave = self.visa.query_binary_values('CURVE?', datatype='H', is_big_endian=False, container=np.ndarray)
          
-        V = (ADCwave - pre[2]) * pre[0] + pre[1]
-        t = np.arange(0, pre[3] * len(V), pre[3])
+        V = self._to_volts(ADCwave, pre)
+        t = self._time_axis(len(V), pre.xinc)
         return t, V 
@@ -9,25 +9,80 @@ University of Twente
 d.h.wielens@utwente.nl
 
 ----------------------------------------------------------------------------
-The latest version (3.0 and above) uses Python's "exec" function
-to reduce the number of lines in the code. Functions that are to be repeated
-for many channels (such as read_temp1, read_temp2, ..., read_temp16) are 
-generated in an exec loop.
+Functions that are to be repeated for many channels (such as read_temp1,
+read_temp2, ..., read_temp16) are implemented once with the channel as
+argument (e.g. _read_temp), and created on first use by __getattr__.
 ----------------------------------------------------------------------------
 """
 
 import socket
+import sys
+import threading
+import functools
+import re
+import enum
+
+# Scale factors of the SI prefixes in Triton responses, see convertUnits
+_SUFFIX = {'n': 1e-9, 'u': 1e-6, 'm': 1e-3}
 
 def convertUnits(val):
-    if val[-1] == 'n':
-        val = float(val[:-1] + 'E-9')
-    elif val[-1] == 'u':
-        val = float(val[:-1] + 'E-6')
-    elif val[-1] == 'm':
-        val = float(val[:-1] + 'E-3')
+    # Values that were already converted are returned as they are
+    if isinstance(val, (int, float)):
+        return float(val)
+    scale = _SUFFIX.get(val[-1])
+    if scale is None:
+        return float(val)
+    return float(val[:-1]) * scale
+
+# Units of the values in Triton responses, by the name of the field before the value, see _parse_value
+_UNITS = {'TEMP': 'K', 'TSET': 'K', 'RATE': 'K/min', 'MAG': 'V', 'RANGE': 'A', 'POWR': 'W',
+          'PRES': 'B', 'HHP': 'B', 'HLP': 'B', 'WIT': 'C', 'WOT': 'C', 'HT': 'C', 'MCUR': 'A',
+          'SPD': 'Hz', 'HRS': 'h'}
+
+def _parse_value(resp, strip=None):
+    # The value is the last field of a response such as 'STAT:DEV:T5:TEMP:SIG:TEMP:1.2345K',
+    # without its unit (strip). By default, the unit is looked up in _UNITS. Only an exact
+    # unit suffix is removed, so an unexpected response is not silently turned into a number.
+    head, sep, val = resp.rpartition(':')
+    if strip is None:
+        strip = _UNITS.get(head.rpartition(':')[2], '')
+    if strip and val.endswith(strip):
+        return val[:-len(strip)]
     return val
         
 
+# Per-channel functions, see Triton.__getattr__: name prefix -> (method, number of channels)
+_CHAN_FUNCS = {'read_temp': ('_read_temp', 16),
+               'read_Tenab': ('_read_Tenab', 16),
+               'write_Tenab': ('_write_Tenab', 16),
+               'read_Texc': ('_read_Texc', 16),
+               'read_pres': ('_read_pres', 16),
+               'read_valve': ('_read_valve', 9),
+               'write_valve': ('_write_valve', 16)}
+_CHAN_RE = re.compile(r'^([a-z]+_[A-Za-z]+)(\d+)$')
+
+class ValveState(str, enum.Enum):
+    # Valve states as returned by read_valve*. These are str subclasses, so comparing with the
+    # response text (e.g. == 'OPEN') keeps working, but they can also be compared with 'is'.
+    OPEN = 'OPEN'
+    CLOSED = 'CLOSE'
+    TOGGLE = 'TOGGLE'
+    __str__ = str.__str__
+
+_VALVE_STATES = {state.value: state for state in ValveState}
+
+# Responses of ON/OFF settings, see read_ratestatus
+_ONOFF = {'ON': 1, 'OFF': 0}
+
+def _locked(func):
+    # Hold the connection lock during the whole function, for functions that send several
+    # commands that belong together (e.g. look up the control channel, then set its setpoint)
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return func(self, *args, **kwargs)
+    return wrapper
+
 class WrongInstrErr(Exception):
     """
     A connection was established to the instrument, but the instrument
@@ -39,212 +94,300 @@ class WrongInstrErr(Exception):
 class Triton:
     type = 'Oxford Triton'
 
-    def __init__(self, IPaddress, port=33576):
+    # Fixed command prefixes of write functions, see _set
+    _SET_HCHAMBER = b'SET:DEV:H1:HTR:SIG:POWR:'
+    _SET_HSTILL = b'SET:DEV:H2:HTR:SIG:POWR:'
+    _SET_TURBSTATE = b'SET:DEV:TURB1:PUMP:SIG:STATE:'
+
+    def __init__(self, IPaddress, port=33576, socket_options=None):
         # Port should be a number, not a string
         if not isinstance(port, int):
             port = int(port)
         # Prepare socket instance
         self.s = socket.socket()
+        # Short commands should be sent immediately instead of being delayed by Nagle's algorithm
+        self.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Room for the responses of batched queries, and detect a dead controller
+        self.s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+        self.s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+        self.s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Additional options as a list of (level, option, value), e.g. to change SO_RCVBUF
+        if socket_options is not None:
+            for level, opt, val in socket_options:
+                self.s.setsockopt(level, opt, val)
         self.s.connect((IPaddress, port))
+        # Acknowledge responses immediately (Linux only)
+        if hasattr(socket, 'TCP_QUICKACK'):
+            self.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        # Buffered reader, such that each response is read up to its newline, even when it
+        # is split over (or combined with others in) TCP segments. The 16 KiB buffer holds the
+        # responses of a whole batch (e.g. info), such that they are read with few recv calls.
+        self._rfile = self.s.makefile('rb', buffering=16384)
+        # Prevents that threads (e.g. qtmlab.parallel_read) interleave their commands on the socket.
+        # Reentrant, such that functions decorated with _locked can call query etc.
+        self._lock = threading.RLock()
+        # Temperature control channel, see read_Tchan
+        self._tchan = None
 
     def close(self):
-        self.s.close()
+        # Waits for a query in progress in another thread
+        with self._lock:
+            self._rfile.close()
+            self.s.close()
+
+    def _readline(self):
+        # Read one response line, without the newline
+        line = self._rfile.readline()
+        if not line.endswith(b'\n'):
+            raise ConnectionError('The connection to the Triton was closed')
+        return line[:-1].decode()
 
     def query(self, val):
-        self.s.sendall((val + '\r\n').encode())
-        resp = self.s.recv(1024).decode()
+        return self._query_cmd((val + '\r\n').encode())
+
+    def _query_cmd(self, cmd):
+        # Send a complete command (bytes, including the line ending) and return the response
+        with self._lock:
+            self.s.sendall(cmd)
+            resp = self._readline()
         return resp
 
-    # Create functions for reading any temperature sensor (chan. 1-16) in the system
-    for i in range(16):
-        exec("def read_temp" + str(i+1) + "(self):\n" +
-             "    self.s.sendall(('READ:DEV:T" + str(i+1) + ":TEMP:SIG:TEMP\\r\\n').encode())\n" +
-             "    resp = self.s.recv(1024).decode().split(':')[-1].strip('K\\n')\n" +
-             "    return float(resp)")
-    
-    # Create functions for reading if any temperature channel is enabled (chan. 1-16) in the system
-    for i in range(16):
-        exec("def read_Tenab" + str(i+1) + "(self):\n" +
-             "    self.s.sendall(('READ:DEV:T" + str(i+1) + ":TEMP:MEAS:ENAB\\r\\n').encode())\n" +
-             "    resp = self.s.recv(1024).decode().split(':')[-1].strip('\\n')\n" +
-             "    return resp")
-
-    # Create functions for writing whether any temperature channel must be enabled/disabled (chan. 1-16) in the system
-    # Provide 'ON' or 'OFF' as <val>          
-    for i in range(16):
-        exec("def write_Tenab" + str(i+1) + "(self, val):\n" +
-             "    self.s.sendall(('SET:DEV:T" + str(i+1) + ":TEMP:MEAS:ENAB:' + str(val) + '\\r\\n').encode())\n" +
-             "    resp = self.s.recv(1024).decode()")
-
-    # Create functions for reading temperature channel excitation voltages (chan. 1-16) [Assumes voltage excitation]
-    for i in range(16):
-        exec("def read_Texc" + str(i+1) + "(self):\n" +
-             "    self.s.sendall(('READ:DEV:T" + str(i+1) + ":TEMP:EXCT:MAG\\r\\n').encode())\n" +
-             "    resp = self.s.recv(1024).decode().split(':')[-1].strip('V\\n')\n" +
-             "    return float(resp)")
-        
-    # Create functions for reading any pressure sensor (chan. 1-6) in the system
-    for i in range(16):
-        exec("def read_pres" + str(i+1) + "(self):\n" +
-             "    self.s.sendall(('READ:DEV:P" + str(i+1) + ":PRES:SIG:PRES\\r\\n').encode())\n" +
-             "    resp = self.s.recv(1024).decode().split(':')[-1].strip('B\\n')\n" +
-             "    return convertUnits(resp)")
-        
-    # Create functions for reading any valve actuator (chan. 1-9) in the system
-    for i in range(9):
-        exec("def read_valve" + str(i+1) + "(self):\n" +
-             "    self.s.sendall(('READ:DEV:V" + str(i+1) + ":VALV:SIG:STATE\\r\\n').encode())\n" +
-             "    resp = self.s.recv(1024).decode().split(':')[-1].strip('\\n')\n" +
-             "    return resp")
-        
-    # Create functions for writing whether any valve actuactor must be opened/closed (chan. 1-9) in the system
-    # Provide 'OPEN' or 'CLOSE' or 'TOGGLE' as <val>          
-    for i in range(16):
-        exec("def write_valve" + str(i+1) + "(self, val):\n" +
-             "    self.s.sendall(('SET:DEV:V" + str(i+1) + ":VALV:SIG:STATE:' + str(val) + '\\r\\n').encode())\n" +
-             "    resp = self.s.recv(1024).decode()")
-    
-    # Get the temperature control channel    
+    def query_batch(self, cmds):
+        # Send several commands in one go and collect one response line per command,
+        # such that only a single network round trip is needed
+        with self._lock:
+            self.s.sendall(('\r\n'.join(cmds) + '\r\n').encode())
+            return [self._readline() for cmd in cmds]
+
+    def _set(self, prefix, val):
+        # Send a SET command given as a bytes prefix plus value, and return the response
+        with self._lock:
+            self.s.sendall(prefix + str(val).encode() + b'\r\n')
+            resp = self._readline()
+        return resp
+
+    def __getattr__(self, name):
+        # Only called for attributes that do not exist, such as read_temp5. These are
+        # created from the per-channel function and stored, such that this happens only once.
+        m = _CHAN_RE.match(name)
+        if m is not None and m.group(1) in _CHAN_FUNCS:
+            meth, nchan = _CHAN_FUNCS[m.group(1)]
+            chan = int(m.group(2))
+            if 1 <= chan <= nchan:
+                func = functools.partial(getattr(self, meth), chan)
+                setattr(self, name, func)
+                return func
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def __dir__(self):
+        # List the per-channel functions as well (e.g. for qtmlab.snapshot)
+        names = set(super().__dir__())
+        for prefix, (meth, nchan) in _CHAN_FUNCS.items():
+            names.update(prefix + str(i+1) for i in range(nchan))
+        return sorted(names)
+
+    # Commands of the per-channel read functions by channel, prepared once
+    _CMD_TEMP = {i+1: b'READ:DEV:T%d:TEMP:SIG:TEMP\r\n' % (i+1) for i in range(16)}
+    _CMD_TENAB = {i+1: b'READ:DEV:T%d:TEMP:MEAS:ENAB\r\n' % (i+1) for i in range(16)}
+    _CMD_TEXC = {i+1: b'READ:DEV:T%d:TEMP:EXCT:MAG\r\n' % (i+1) for i in range(16)}
+    _CMD_PRES = {i+1: b'READ:DEV:P%d:PRES:SIG:PRES\r\n' % (i+1) for i in range(16)}
+    _CMD_VALVE = {i+1: b'READ:DEV:V%d:VALV:SIG:STATE\r\n' % (i+1) for i in range(9)}
+
+    # Read any temperature sensor (chan. 1-16) in the system
+    def _read_temp(self, chan):
+        resp = _parse_value(self._query_cmd(self._CMD_TEMP[chan]))
+        return float(resp)
+
+    # Read if any temperature channel is enabled (chan. 1-16) in the system
+    def _read_Tenab(self, chan):
+        resp = _parse_value(self._query_cmd(self._CMD_TENAB[chan]))
+        return resp
+
+    # Write whether any temperature channel must be enabled/disabled (chan. 1-16) in the system
+    # Provide 'ON' or 'OFF' as <val>
+    def _write_Tenab(self, chan, val):
+        self._set(b'SET:DEV:T%d:TEMP:MEAS:ENAB:' % chan, val)
+
+    # Read temperature channel excitation voltages (chan. 1-16) [Assumes voltage excitation]
+    def _read_Texc(self, chan):
+        resp = _parse_value(self._query_cmd(self._CMD_TEXC[chan]))
+        return float(resp)
+
+    # Read any pressure sensor (chan. 1-6) in the system
+    def _read_pres(self, chan):
+        resp = _parse_value(self._query_cmd(self._CMD_PRES[chan]))
+        return convertUnits(resp)
+
+    # Read any valve actuator (chan. 1-9) in the system
+    def _read_valve(self, chan):
+        resp = _parse_value(self._query_cmd(self._CMD_VALVE[chan]))
+        # Unknown responses are returned as text
+        return _VALVE_STATES.get(resp, resp)
+
+    # Write whether any valve actuactor must be opened/closed (chan. 1-9) in the system
+    # Provide 'OPEN' or 'CLOSE' or 'TOGGLE' as <val>
+    def _write_valve(self, chan, val):
+        self._set(b'SET:DEV:V%d:VALV:SIG:STATE:' % chan, val)
+
+    # Read all temperature sensors (chan. 1-16) in one round trip
+    def read_all_temps(self):
+        resp = self.query_batch(['READ:DEV:T' + str(i+1) + ':TEMP:SIG:TEMP' for i in range(16)])
+        return [float(_parse_value(r)) for r in resp]
+
+    # Read all pressure sensors (chan. 1-6) in one round trip
+    _PRES_CMDS = ['READ:DEV:P' + str(i+1) + ':PRES:SIG:PRES' for i in range(6)]
+
+    def read_all_pressures(self):
+        return self._pressures(self.query_batch(self._PRES_CMDS))
+
+    def _pressures(self, resp):
+        return [convertUnits(_parse_value(r)) for r in resp]
+
+    # Get the temperature control channel. It is only looked up once, as it only changes by
+    # write_Tchan. Call invalidate_tchan when it was changed otherwise (e.g. in the Triton software).
     def read_Tchan(self):
+        if self._tchan is not None:
+            return self._tchan
+        msgs = self.query_batch(self._TCHAN_CMDS)
+        return self._find_tchan(msgs)
+
+    # Commands and response handling of read_Tchan, such that info can include them in its batch
+    _TCHAN_CMDS = ['READ:DEV:T' + str(i+1) + ':TEMP:LOOP:MODE' for i in range(16)]
+
+    def _find_tchan(self, msgs):
         for i in range(16):
-            self.s.sendall(('READ:DEV:T' + str(i+1) + ':TEMP:LOOP:MODE\r\n').encode())
-            msg = self.s.recv(1024).decode().split(':')[-1].strip('A\n')
+            msg = _parse_value(msgs[i])
             if not msg == 'NOT_FOUND':
                 resp = i+1
+        self._tchan = resp
         return resp  
+
+    def invalidate_tchan(self):
+        self._tchan = None
     
     # Select the temperature control channel
+    @_locked
     def write_Tchan(self, val):
-        self.s.sendall(('SET:DEV:T' + str(val) + ':TEMP:LOOP:HTR:H1\r\n').encode())
-        self.s.recv(1024).decode()  
+        self.query('SET:DEV:T' + str(val) + ':TEMP:LOOP:HTR:H1')
+        self._tchan = int(val)
                         
     # Read the temperature setpoint of the heater (using the control channel as read from read_Tchan)
+    @_locked
     def read_Tset(self):
         chan = self.read_Tchan()
-        self.s.sendall(('READ:DEV:T' + str(chan) + ':TEMP:LOOP:TSET\r\n').encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('K\n'))
+        resp = float(_parse_value(self.query('READ:DEV:T' + str(chan) + ':TEMP:LOOP:TSET')))
         return resp
         
     # Write the temperature setpoint of the heater (using read_Tchan)
+    @_locked
     def write_Tset(self, val):
         chan = self.read_Tchan()
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:TSET:' + str(val) + '\r\n').encode())
-        self.s.recv(1024)
+        self._set(b'SET:DEV:T%d:TEMP:LOOP:TSET:' % chan, val)
     
     # Read PID settings for the heater (using read_Tchan)
+    @_locked
     def read_PID(self):
         chan = self.read_Tchan()
-        self.s.sendall(('READ:DEV:T' + str(chan) + ':TEMP:LOOP:P\r\n').encode())
-        p = self.s.recv(1024).decode().split(':')[-1].strip('\n')
-        self.s.sendall(('READ:DEV:T' + str(chan) + ':TEMP:LOOP:I\r\n').encode())
-        i = self.s.recv(1024).decode().split(':')[-1].strip('\n')
-        self.s.sendall(('READ:DEV:T' + str(chan) + ':TEMP:LOOP:D\r\n').encode())
-        d = self.s.recv(1024).decode().split(':')[-1].strip('\n')
+        cmd = 'READ:DEV:T' + str(chan) + ':TEMP:LOOP:'
+        resp = self.query_batch([cmd + 'P', cmd + 'I', cmd + 'D'])
+        p, i, d = [_parse_value(r) for r in resp]
         return [p, i, d]
     
     # Write PID settings for the heater (using the control channel from read_Tchan)
+    @_locked
     def write_PID(self, p, i, d):
         chan = self.read_Tchan()
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:P:' + str(p) + '\r\n').encode())
-        self.s.recv(1024)
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:I:' + str(i) + '\r\n').encode())
-        self.s.recv(1024)
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:D:' + str(d) + '\r\n').encode())
-        self.s.recv(1024)
+        cmd = 'SET:DEV:T' + str(chan) + ':TEMP:LOOP:'
+        self.query_batch([cmd + 'P:' + str(p), cmd + 'I:' + str(i), cmd + 'D:' + str(d)])
 
     # Turn on the closed heater loop (using the control channel from read_Tchan)    
+    @_locked
     def loop_on(self):
         chan = self.read_Tchan()
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:MODE:ON\r\n').encode())
-        self.s.recv(1024)
+        self.query('SET:DEV:T' + str(chan) + ':TEMP:LOOP:MODE:ON')
 
     # Turn off the closed heater loop (using the control channel from read_Tchan)
+    @_locked
     def loop_off(self):
         chan = self.read_Tchan()
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:MODE:OFF\r\n').encode())
-        self.s.recv(1024)
+        self.query('SET:DEV:T' + str(chan) + ':TEMP:LOOP:MODE:OFF')
 
     # Read the loop status (from read_Tchan)
+    @_locked
     def read_loop(self):
         chan = self.read_Tchan()
-        self.s.sendall(('READ:DEV:T' + str(chan) + ':TEMP:LOOP:MODE\r\n').encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('K\n')
+        resp = _parse_value(self.query('READ:DEV:T' + str(chan) + ':TEMP:LOOP:MODE'))
         return resp
     
     # Read the heater range (by using read_Tchan)
+    @_locked
     def read_range(self):
         chan = self.read_Tchan()
-        self.s.sendall(('READ:DEV:T' + str(chan) + ':TEMP:LOOP:RANGE\r\n').encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('A\n')
+        resp = _parse_value(self.query('READ:DEV:T' + str(chan) + ':TEMP:LOOP:RANGE'))
         return convertUnits(resp)
     
     # Write the heater range (by using read_Tchan)
+    @_locked
     def write_range(self, val):
         chan = self.read_Tchan()
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:RANGE: ' + str(val) + '\r\n').encode())
-        self.s.recv(1024)
+        self._set(b'SET:DEV:T%d:TEMP:LOOP:RANGE: ' % chan, val)
 
     # Write the temperature control ramp rate (using read_Tchan)
+    @_locked
     def write_Trate(self, val):
         chan = self.read_Tchan()
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:RAMP:RATE:' + str(val) + '\r\n').encode())
-        self.s.recv(1024)
+        self._set(b'SET:DEV:T%d:TEMP:LOOP:RAMP:RATE:' % chan, val)
 
     # Read the temperature control ramp rate (using read_Tchan)
+    @_locked
     def read_Trate(self):
         chan = self.read_Tchan()
-        self.s.sendall(('READ:DEV:T' + str(chan) + ':TEMP:LOOP:RAMP:RATE\r\n').encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('K/min\n')
+        resp = _parse_value(self.query('READ:DEV:T' + str(chan) + ':TEMP:LOOP:RAMP:RATE'))
         return resp
     
     # Read the control temperature ramp status (enabled/disabled)
+    @_locked
     def read_ratestatus(self):
         chan = self.read_Tchan()
-        self.s.sendall(('READ:DEV:T' + str(chan) + ':TEMP:LOOP:RAMP:ENAB\r\n').encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('\n')
-        if resp == 'ON':
-            return 1
-        elif resp == 'OFF':
-            return 0
-        else:
+        resp = _parse_value(self.query('READ:DEV:T' + str(chan) + ':TEMP:LOOP:RAMP:ENAB'))
+        if resp not in _ONOFF:
             raise ValueError('Expected to receive "ON" or "OFF" but got a different response.')
+        return _ONOFF[resp]
     
     # Write the control temperature ramp status (use 'ON' or 'OFF' as <val>)
+    @_locked
     def write_ratestatus(self, val):
         chan = self.read_Tchan()
-        self.s.sendall(('SET:DEV:T' + str(chan) + ':TEMP:LOOP:RAMP:ENAB:' + str(val) + '\r\n').encode())
-        self.s.recv(1024)
+        self._set(b'SET:DEV:T%d:TEMP:LOOP:RAMP:ENAB:' % chan, val)
 
     def write_Hchamber(self, val):
         # Setpoint is in uW
-        self.s.sendall(('SET:DEV:H1:HTR:SIG:POWR:' + str(val) + '\r\n').encode())
-        self.s.recv(1024)
+        self._set(self._SET_HCHAMBER, val)
 
     def read_Hchamber(self):
-        self.s.sendall('READ:DEV:H1:HTR:SIG:POWR\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('W\n')
+        resp = _parse_value(self.query('READ:DEV:H1:HTR:SIG:POWR'))
         resp = convertUnits(resp)
         return resp
 
     def write_Hstill(self, val):
         # Setpoint is in uW
-        self.s.sendall(('SET:DEV:H2:HTR:SIG:POWR:' + str(val) + '\r\n').encode())
-        self.s.recv(1024)
+        self._set(self._SET_HSTILL, val)
 
     def read_Hstill(self):
-        self.s.sendall('READ:DEV:H2:HTR:SIG:POWR\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('W\n')
+        resp = _parse_value(self.query('READ:DEV:H2:HTR:SIG:POWR'))
         resp = convertUnits(resp)
         return resp
             
     def read_status(self):
-        self.s.sendall('READ:SYS:DR:STATUS\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('\n')
+        resp = _parse_value(self.query('READ:SYS:DR:STATUS'))
         return resp  
 
     def read_action(self):
-        self.s.sendall('READ:SYS:DR:ACTN\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('\n')
+        resp = _parse_value(self.query('READ:SYS:DR:ACTN'))
+        return self._action_name(resp)
+
+    def _action_name(self, resp):
+        # Convert the READ:SYS:DR:ACTN code into a description
         if resp == 'PCL':
             return 'Precooling'
         elif resp == 'EPCL':
@@ -263,92 +406,80 @@ class Triton:
     
     # Read the speed of the turbo pump
     def read_turbspeed(self):
-        self.s.sendall('READ:DEV:TURB1:PUMP:SIG:SPD\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('Hz\n'))
+        resp = float(_parse_value(self.query('READ:DEV:TURB1:PUMP:SIG:SPD')))
         return resp  
     
     # Read the status (on/off) of the turbo pump
     def read_turbstate(self):
-        self.s.sendall('READ:DEV:TURB1:PUMP:SIG:STATE\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('\n')
+        resp = _parse_value(self.query('READ:DEV:TURB1:PUMP:SIG:STATE'))
         return resp  
     
     # Set state of the turbo
     def write_turbstate(self, val):
-        self.s.sendall(('SET:DEV:TURB1:PUMP:SIG:STATE:' + val + '\r\n').encode())
-        self.s.recv(1024)
+        self._set(self._SET_TURBSTATE, val)
     
     # Read the cumulative operational hours of the turbo pump
     def read_turbhours(self):
-        self.s.sendall('READ:DEV:TURB1:PUMP:SIG:HRS\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('h\n'))
+        resp = float(_parse_value(self.query('READ:DEV:TURB1:PUMP:SIG:HRS')))
         return resp
     
     # Read the status (on/off) of the 3He compressor
     def read_compstate(self):
-        self.s.sendall('READ:DEV:COMP:PUMP:SIG:STATE\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('\n')
+        resp = _parse_value(self.query('READ:DEV:COMP:PUMP:SIG:STATE'))
         return resp      
 
     # Read the status (on/off) of the 3He compressor
     def read_fpstate(self):
-        self.s.sendall('READ:DEV:FP:PUMP:SIG:STATE\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('\n')
+        resp = _parse_value(self.query('READ:DEV:FP:PUMP:SIG:STATE'))
         return resp 
     
     # Read the status (on/off) of the PTR compressor
     def read_PTRstate(self):
-        self.s.sendall('READ:DEV:C1:PTC\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')[-1].strip('\n')
+        resp = _parse_value(self.query('READ:DEV:C1:PTC'))
         # Note that this response gets ALL parameters of the PTR compressor!
         return resp     
 
     # Read PTR pressure on the high side (bar)
     def read_PTRhigh(self):
-        self.s.sendall('READ:DEV:C1:PTC:SIG:HHP\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('B\n'))
+        resp = float(_parse_value(self.query('READ:DEV:C1:PTC:SIG:HHP')))
         return resp
 
     # Read PTR pressure on the low side (bar)
     def read_PTRlow(self):
-        self.s.sendall('READ:DEV:C1:PTC:SIG:HLP\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('B\n'))
+        resp = float(_parse_value(self.query('READ:DEV:C1:PTC:SIG:HLP')))
         return resp
     
     # Read PTR H2O in temperature (deg C)
     def read_PTRwaterin(self):
-        self.s.sendall('READ:DEV:C1:PTC:SIG:WIT\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('C\n'))
+        resp = float(_parse_value(self.query('READ:DEV:C1:PTC:SIG:WIT')))
         return resp
 
     # Read PTR H2O out temperature (deg C)
     def read_PTRwaterout(self):
-        self.s.sendall('READ:DEV:C1:PTC:SIG:WOT\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('C\n'))
+        resp = float(_parse_value(self.query('READ:DEV:C1:PTC:SIG:WOT')))
         return resp
 
     # Read PTR He gas temperature (deg C)
     def read_PTRhelium(self):
-        self.s.sendall('READ:DEV:C1:PTC:SIG:HT\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('C\n'))
+        resp = float(_parse_value(self.query('READ:DEV:C1:PTC:SIG:HT')))
         return resp
     
     # Read PTR motor current (A)
     def read_PTRmotor(self):
-        self.s.sendall('READ:DEV:C1:PTC:SIG:MCUR\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('A\n'))
+        resp = float(_parse_value(self.query('READ:DEV:C1:PTC:SIG:MCUR')))
         return resp
     
     # Read PTR He gas temperature (deg C)
     def read_PTRhours(self):
-        self.s.sendall('READ:DEV:C1:PTC:SIG:HRS\r\n'.encode())
-        resp = float(self.s.recv(1024).decode().split(':')[-1].strip('h\n'))
+        resp = float(_parse_value(self.query('READ:DEV:C1:PTC:SIG:HRS')))
         return resp
     
     # Read the list of assigned temperature channels in the Triton software
     def read_Tchandefs(self):
-        self.s.sendall('READ:SYS:DR:CHAN\r\n'.encode())
-        resp = self.s.recv(1024).decode().split(':')
+        return self._chandefs(self.query('READ:SYS:DR:CHAN'))
+
+    def _chandefs(self, resp):
+        resp = resp.split(':')
         chan_still = 'Still: ' + resp[5][-1]
         chan_mix = 'Mixing chamber: ' + resp[7][-1]
         chan_cool = 'Cooldown: ' + resp[9][-1]
@@ -356,55 +487,80 @@ class Triton:
         chan_pt2 = 'PT2: ' + resp[13][-1]
         return [chan_still, chan_mix, chan_cool, chan_pt1, chan_pt2]
     
+    @_locked
     def info(self):
-        print('-----------------------------------------------------')
-        print('System status:               ' + str(self.read_status()))
-        print('Automation task:             ' + str(self.read_action()))
-        print('-----------------------------------------------------')
-        # Get cooldown channel and then request temperature value and status of that channel
-        chan_cool = str(self.read_Tchandefs()[2].split(':')[1].strip(' '))
-        self.s.sendall(('READ:DEV:T' + str(chan_cool) + ':TEMP:SIG:TEMP\r\n').encode())
-        resp1 = self.s.recv(1024).decode().split(':')[-1].strip('K\n')
-        self.s.sendall(('READ:DEV:T' + str(chan_cool) + ':TEMP:MEAS:ENAB\r\n').encode())
-        resp2 = self.s.recv(1024).decode().split(':')[-1].strip('\n')
-        print('Cooldown channel temp (' + str(chan_cool) + '):   ' + str(resp1) + ' K, (sensor: ' + resp2 + ')')  
-        chan_mix = str(self.read_Tchandefs()[1].split(':')[1].strip(' '))
-        self.s.sendall(('READ:DEV:T' + str(chan_mix) + ':TEMP:SIG:TEMP\r\n').encode())
-        resp3 = self.s.recv(1024).decode().split(':')[-1].strip('K\n')
-        self.s.sendall(('READ:DEV:T' + str(chan_mix) + ':TEMP:MEAS:ENAB\r\n').encode())
-        resp4 = self.s.recv(1024).decode().split(':')[-1].strip('\n')
-        print('Mixing chamber temp (' + str(chan_mix) + '):     ' + str(resp3) + ' K, (sensor: ' + resp4 + ')') 
-        print('-----------------------------------------------------')
-        print('Tank pressure (P1):          ' + str(self.read_pres1()) + str(' bar'))
-        print('Condense pressure (P2):      ' + str(self.read_pres2()) + str(' bar'))
-        print('Still pressure (P3):         ' + str(self.read_pres3()) + str(' bar'))
-        print('Turbo back pressure (P4):    ' + str(self.read_pres4()) + str(' bar'))
-        print('Forepump back pressure (P5): ' + str(self.read_pres5()) + str(' bar'))
-        print('OVC pressure (P6):           ' + str(self.read_pres6()) + str(' bar'))
-        print('------------------------------------------------------')
-        print('Heater mode:                 ' + str(self.read_loop()))
-        print('Heater control channel:      ' + str(self.read_Tchan()))
-        self.s.sendall(('READ:DEV:T' + str(self.read_Tchan()) + ':TEMP:LOOP:TSET\r\n').encode())
-        resp5 = self.s.recv(1024).decode().split(':')[-1].strip('K\n')
-        print('Heater setpoint:             ' + str(resp5) + ' K')
-        self.s.sendall(('READ:DEV:T' + str(self.read_Tchan()) + ':TEMP:LOOP:RANGE\r\n').encode())
-        resp6 = self.s.recv(1024).decode().split(':')[-1].strip('\n')
-        print('Heater range:                ' + str(resp6))
-        print('------------------------------------------------------')
-        print('Valve 1:                     ' + str(self.read_valve1()))
-        print('Valve 2:                     ' + str(self.read_valve2()))
-        print('Valve 3:                     ' + str(self.read_valve3()))
-        print('Valve 4:                     ' + str(self.read_valve4()))
-        print('Valve 5:                     ' + str(self.read_valve5()))
-        print('Valve 6:                     ' + str(self.read_valve6()))
-        print('Valve 7:                     ' + str(self.read_valve7()))
-        print('Valve 8:                     ' + str(self.read_valve8()))
-        print('Valve 9:                     ' + str(self.read_valve9()))
-        print('------------------------------------------------------')
-        print('3He compressor:              ' + str(self.read_compstate()))
-        print('Forepump:                    ' + str(self.read_fpstate()))
-        print('Turbo pump:                  ' + str(self.read_turbstate()) + ' (' + str(self.read_turbspeed()) + ' Hz)')
-        print('Pulse tube compressor:       ' + str(self.read_PTRstate()))
-        print('------------------------------------------------------')
-        
-        
+        # Channel definitions and control channel first (in one round trip), as the other
+        # commands depend on them
+        if self._tchan is None:
+            resp = self.query_batch(['READ:SYS:DR:CHAN'] + self._TCHAN_CMDS)
+            chan = self._find_tchan(resp[1:])
+        else:
+            resp = self.query_batch(['READ:SYS:DR:CHAN'])
+            chan = self._tchan
+        chandefs = self._chandefs(resp[0])
+        chan_cool = str(chandefs[2].split(':')[1].strip(' '))
+        chan_mix = str(chandefs[1].split(':')[1].strip(' '))
+        # Request all other values in a single round trip
+        cmds = ['READ:SYS:DR:STATUS',
+                'READ:SYS:DR:ACTN',
+                'READ:DEV:T' + chan_cool + ':TEMP:SIG:TEMP',
+                'READ:DEV:T' + chan_cool + ':TEMP:MEAS:ENAB',
+                'READ:DEV:T' + chan_mix + ':TEMP:SIG:TEMP',
+                'READ:DEV:T' + chan_mix + ':TEMP:MEAS:ENAB']
+        cmds += self._PRES_CMDS
+        cmds += ['READ:DEV:T' + str(chan) + ':TEMP:LOOP:MODE',
+                 'READ:DEV:T' + str(chan) + ':TEMP:LOOP:TSET',
+                 'READ:DEV:T' + str(chan) + ':TEMP:LOOP:RANGE']
+        cmds += ['READ:DEV:V' + str(i+1) + ':VALV:SIG:STATE' for i in range(9)]
+        cmds += ['READ:DEV:COMP:PUMP:SIG:STATE',
+                 'READ:DEV:FP:PUMP:SIG:STATE',
+                 'READ:DEV:TURB1:PUMP:SIG:STATE',
+                 'READ:DEV:TURB1:PUMP:SIG:SPD',
+                 'READ:DEV:C1:PTC']
+        resp = self.query_batch(cmds)
+        status = _parse_value(resp[0])
+        action = self._action_name(_parse_value(resp[1]))
+        resp1 = _parse_value(resp[2])
+        resp2 = _parse_value(resp[3])
+        resp3 = _parse_value(resp[4])
+        resp4 = _parse_value(resp[5])
+        pres = self._pressures(resp[6:12])
+        loop = _parse_value(resp[12])
+        resp5 = _parse_value(resp[13])
+        resp6 = _parse_value(resp[14], '')
+        valves = [_VALVE_STATES.get(v, v) for v in (_parse_value(r) for r in resp[15:24])]
+        compstate = _parse_value(resp[24])
+        fpstate = _parse_value(resp[25])
+        turbstate = _parse_value(resp[26])
+        turbspeed = float(_parse_value(resp[27]))
+        PTRstate = _parse_value(resp[28])
+
+        lines = []
+        lines.append('-----------------------------------------------------')
+        lines.append('System status:               ' + str(status))
+        lines.append('Automation task:             ' + str(action))
+        lines.append('-----------------------------------------------------')
+        lines.append('Cooldown channel temp (' + str(chan_cool) + '):   ' + str(resp1) + ' K, (sensor: ' + resp2 + ')')  
+        lines.append('Mixing chamber temp (' + str(chan_mix) + '):     ' + str(resp3) + ' K, (sensor: ' + resp4 + ')') 
+        lines.append('-----------------------------------------------------')
+        lines.append('Tank pressure (P1):          ' + str(pres[0]) + str(' bar'))
+        lines.append('Condense pressure (P2):      ' + str(pres[1]) + str(' bar'))
+        lines.append('Still pressure (P3):         ' + str(pres[2]) + str(' bar'))
+        lines.append('Turbo back pressure (P4):    ' + str(pres[3]) + str(' bar'))
+        lines.append('Forepump back pressure (P5): ' + str(pres[4]) + str(' bar'))
+        lines.append('OVC pressure (P6):           ' + str(pres[5]) + str(' bar'))
+        lines.append('------------------------------------------------------')
+        lines.append('Heater mode:                 ' + str(loop))
+        lines.append('Heater control channel:      ' + str(chan))
+        lines.append('Heater setpoint:             ' + str(resp5) + ' K')
+        lines.append('Heater range:                ' + str(resp6))
+        lines.append('------------------------------------------------------')
+        for i in range(9):
+            lines.append('Valve ' + str(i+1) + ':                     ' + str(valves[i]))
+        lines.append('------------------------------------------------------')
+        lines.append('3He compressor:              ' + str(compstate))
+        lines.append('Forepump:                    ' + str(fpstate))
+        lines.append('Turbo pump:                  ' + str(turbstate) + ' (' + str(turbspeed) + ' Hz)')
+        lines.append('Pulse tube compressor:       ' + str(PTRstate))
+        lines.append('------------------------------------------------------')
+        sys.stdout.write('\n'.join(lines) + '\n')
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Caching of read functions, shared by the instrument modules.
+"""
+
+import functools
+import time
+
+# Time (s) for which settings such as rates and setpoints are cached. They are also dropped from
+# the cache when set through the driver, but can be changed from the front panel or by another
+# client as well.
+SETTING_TTL = 5.0
+
+class Memoized:
+    """
+    Mixin for instruments that cache invariant or slowly changing read functions with ttl_cache.
+    Call self._init_cache() in __init__; memoize_off() makes every read query the device again.
+    """
+    def _init_cache(self):
+        self._cache = {}
+        self._memoize = True
+        self.statistics = {'hits': 0, 'misses': 0}
+
+    def memoize_on(self):
+        self._memoize = True
+
+    def memoize_off(self):
+        # Always query the device, e.g. for debugging
+        self._memoize = False
+        self._cache.clear()
+
+def ttl_cache(seconds):
+    """
+    Cache the return value of a read function on the instance for a given number of seconds.
+    The values are stored in self._cache (by function name), such that write functions can
+    invalidate an entry with self._cache.pop(<name>, None). Hits and misses are counted in
+    self.statistics. The instance state is set up by Memoized.
+    """
+    def decorator(func):
+        name = func.__name__
+        @functools.wraps(func)
+        def wrapper(self):
+            if self._memoize and name in self._cache:
+                val, t = self._cache[name]
+                if time.monotonic() - t < seconds:
+                    self.statistics['hits'] += 1
+                    return val
+            self.statistics['misses'] += 1
+            val = func(self)
+            self._cache[name] = (val, time.monotonic())
+            return val
+        return wrapper
+    return decorator
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+Response parsing shared by the Oxford MercuryiPS modules (GPIB and TCP/IP).
+"""
+
+import re
+
+# Numeric value at the end of a response, e.g. 'STAT:DEV:GRPX:PSU:SIG:FLD:0.1000T'
+_NUM_RE = re.compile(r':([-+0-9.eE]+)[A-Za-z/]*\s*$')
+
+def parse_num(resp):
+    m = _NUM_RE.search(resp)
+    if m is None:
+        raise ValueError('Unexpected response: ' + resp)
+    return float(m.group(1))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the pyVISA based instrument modules.
+"""
+
+import pyvisa
+import asyncio
+import threading
+from contextlib import contextmanager
+
+# One VISA resource manager for all instruments, created on first use. Every ResourceManager()
+# call opens another session to the VISA library.
+_RM = None
+
+def get_rm():
+    global _RM
+    if _RM is None:
+        _RM = pyvisa.ResourceManager()
+    return _RM
+
+# Session options of open_gpib: no delay between write and read of a query, and assert EOI with
+# the last byte written
+_GPIB_OPTIONS = {'query_delay': 0.0, 'send_end': True}
+
+def open_gpib(addr, **options):
+    # Open GPIB0::<addr>::INSTR with _GPIB_OPTIONS. Further session options, such as the
+    # terminations, are passed on to open_resource and may override those.
+    return get_rm().open_resource('GPIB0::{}::INSTR'.format(addr), **dict(_GPIB_OPTIONS, **options))
+
+class LockedQueries:
+    """
+    Mixin for drivers with asyncio versions (aread_*) of their read functions, e.g.
+        x, v = asyncio.run(qtmlab.gather_reads(li.aread_x(), dmm.aread_dcv()))
+    All I/O of the driver goes through self._lock, such that synchronous calls and the queries
+    running in worker threads do not interleave. The lock is reentrant, such that a sequence of
+    commands can hold it around _query. Call self._init_lock() in __init__.
+    """
+    def _init_lock(self):
+        self._lock = threading.RLock()
+
+    def _query(self, cmd):
+        with self._lock:
+            return self.visa.query(cmd)
+
+    async def _aquery(self, cmd):
+        # Query in a worker thread, such that queries to several instruments can overlap
+        return await asyncio.to_thread(self._query, cmd)
+
+class _BatchResource:
+    # Stands in for a pyvisa resource within batch(). Plain writes are collected and sent as a
+    # single message; anything else (query, read, ...) first sends the collected writes, such
+    # that the command order is kept, and is then passed on to the resource itself.
+
+    def __init__(self, resource, scpi):
+        object.__setattr__(self, '_resource', resource)
+        object.__setattr__(self, '_scpi', scpi)
+        object.__setattr__(self, '_buf', [])
+
+    def __getattr__(self, name):
+        attr = getattr(self._resource, name)
+        if callable(attr):
+            self.flush()
+        return attr
+
+    def __setattr__(self, name, value):
+        # e.g. a timeout set within the with-block applies to the resource
+        setattr(self._resource, name, value)
+
+    def flush(self):
+        if self._buf:
+            if self._scpi:
+                # Start each command at the root of the SCPI tree
+                msg = ';'.join(cmd if cmd.startswith('*') else ':' + cmd for cmd in self._buf)
+            else:
+                msg = ';'.join(self._buf)
+            self._buf.clear()
+            self._resource.write(msg)
+
+    def write(self, message, *args, **kwargs):
+        if args or kwargs:
+            # Custom termination or encoding: send this one as is
+            self.flush()
+            return self._resource.write(message, *args, **kwargs)
+        cmd = message.strip()
+        self._buf.append(cmd.lstrip(':') if self._scpi else cmd)
+
+    def write_raw(self, message):
+        if b'?' in message:
+            self.flush()
+            return self._resource.write_raw(message)
+        self.write(message.decode())
+
+    def query(self, message, *args, **kwargs):
+        self.flush()
+        return self._resource.query(message, *args, **kwargs)
+
+@contextmanager
+def batch(instr, scpi=True):
+    # Collects all writes to instr within a with-block and sends them as a single message, e.g.
+    #     with k2450.batch():
+    #         k2450.write_dcv(0.1)
+    #         k2450.write_dcv(0.2)
+    # Queries first send the collected writes, such that the command order is kept. Drivers offer
+    # this as their batch() method. instr.visa is replaced by a _BatchResource for the duration of
+    # the with-block. If the block raises, the writes that were not sent yet are dropped rather
+    # than sent half-finished.
+    resource = instr.visa
+    proxy = _BatchResource(resource, scpi)
+    instr.visa = proxy
+    try:
+        yield
+        proxy.flush()
+    finally:
+        proxy._buf.clear()
+        instr.visa = resource
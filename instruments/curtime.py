@@ -16,8 +16,7 @@ import time
 
 class curtime:
     type = 'Current time'
-    def __init__(self):
-        self.time = time
+    time = time
 
     def read_time(self):
         # Returns time in seconds as float number
@@ -26,3 +25,7 @@ class curtime:
     def read_timens(self):
         # Returns time in nanoseconds as integer value
         return time.time_ns()
+
+    def read_timems(self):
+        # Returns time in milliseconds as integer value
+        return time.time_ns() // 1000000
@@ -6,6 +6,10 @@ The latency option determines the time it takes for the dummy instrument to
 
 The response of the device is zero by default, and takes on write_val values instantly.
 
+The aread_*/awrite_* functions are asyncio versions, such that many dummy
+calls can wait concurrently, e.g.
+    asyncio.run(qtmlab.gather_reads(*[dev.aread_val() for dev in devs])).
+
 Version 1.0 (2022-12-12)
 Daan Wielens - Researcher
 University of Twente
@@ -13,6 +17,7 @@ d.h.wielens@utwente.nl
 """
 
 import time
+import asyncio
 
 class dummy:
     type = 'Dummy'
@@ -37,3 +42,20 @@ class dummy:
     def write_slowval(self, val):
         time.sleep(self.latency * 10)
         self.value = val
+
+    # asyncio versions of the functions above
+    async def aread_val(self):
+        await asyncio.sleep(self.latency)
+        return self.value
+
+    async def awrite_val(self, val):
+        await asyncio.sleep(self.latency)
+        self.value = val
+
+    async def aread_slowval(self):
+        await asyncio.sleep(self.latency * 10)
+        return self.value
+
+    async def awrite_slowval(self, val):
+        await asyncio.sleep(self.latency * 10)
+        self.value = val
@@ -11,31 +11,64 @@ d.h.wielens@utwente.nl
 Based on https://github.com/hinnefe2/ppms and https://github.com/masonlab/labdrivers
 """
 
-import clr
-
-# load the C# .dll supplied by Quantum Design
-try:
-    clr.AddReference('QDInstrument')
-except:
-    if clr.FindAssembly('QDInstrument') is None:
-        print('Could not find QDInstrument.dll')
-    else:
-        print('Found QDInstrument.dll at {}'.format(clr.FindAssembly('QDInstrument')))
-        print('Try right-clicking the .dll, selecting "Properties", and then clicking "Unblock"')
-
-# import the C# classes for interfacing with the PPMS
-from QuantumDesign.QDInstrument import *
-
-QDI_DYNACOOL_TYPE = QDInstrumentBase.QDInstrumentType.DynaCool
+import time
+import collections
+
+# The .NET runtime and the QDInstrument classes are loaded by the first Dynacool(),
+# see _ensure_qdi_loaded, such that importing this module is cheap
+QDInstrumentFactory = None
+QDI_DYNACOOL_TYPE = None
 DEFAULT_PORT = 11000
 
+def _ensure_qdi_loaded():
+    global QDInstrumentFactory, QDI_DYNACOOL_TYPE
+    if QDInstrumentFactory is not None:
+        return
+    import clr
+
+    # load the C# .dll supplied by Quantum Design
+    try:
+        clr.AddReference('QDInstrument')
+    except:
+        if clr.FindAssembly('QDInstrument') is None:
+            print('Could not find QDInstrument.dll')
+        else:
+            print('Found QDInstrument.dll at {}'.format(clr.FindAssembly('QDInstrument')))
+            print('Try right-clicking the .dll, selecting "Properties", and then clicking "Unblock"')
+
+    # import the C# classes for interfacing with the PPMS
+    from QuantumDesign.QDInstrument import QDInstrumentBase, QDInstrumentFactory as factory
+
+    QDI_DYNACOOL_TYPE = QDInstrumentBase.QDInstrumentType.DynaCool
+    QDInstrumentFactory = factory
+
+# Status codes returned by the QDInstrument functions
+TEMP_STATUS = ['Temperature unknown', 'Stable', 'Tracking', 'Unused3', 'Unused4', 'Near', 'Chasing', 'Filling',
+               'Unused8', 'Unused9', 'Standby', 'Unused11', 'Unused12', 'Disabled', 'Impedance not functioning', 'Temperature failure']
+FIELD_STATUS = ['Magnet unknown', 'Stable and persistent', 'Warming switch', 'Cooling switch', 'Stable and driven', 'Iterating', 'Charging',
+                'Discharging', 'Current error', 'Unused9', 'Unused10', 'Unused11', 'Unused12', 'Unused13', 'Unused14', 'Magnet failure']
+CHAMBER_STATUS = ['Chamber unknown', 'Purged and sealed', 'Vented and sealed', 'Sealed', 'Purging', 'Venting',
+                  'PreHiVac', 'HighVac', 'PumpContinuous', 'VentContinuous', 'Unused10', 'Unused11', 'Unused12',
+                  'Unused13', 'Unused14', 'Chamber failure']
+POSITION_STATUS = ['Position unknown', 'At target', 'Unused2', 'Unused3', 'Unused4', 'Moving', 'Unused6',
+                   'Unused7', 'At limit switch', 'At index switch', 'Unused10', 'Unused11', 'Unused12',
+                   'Unused13', 'Unused14', 'Position failure']
+
+# Temperature, field and chamber state from one set of calls, see Dynacool._snapshot
+Snapshot = collections.namedtuple('Snapshot', 'temp temp_status field field_status chamber_status')
+# Calls to _snapshot within this time (s) return the previous result
+SNAPSHOT_TTL = 0.05
+
 class Dynacool:
     """Thin wrapper around the QuantumDesign.QDInstrument.QDInstrumentBase class"""
     
     type = 'Dynacool'
 
     def __init__(self, ip_address='127.0.0.1'):
+       _ensure_qdi_loaded()
        self.qdi_instrument = QDInstrumentFactory.GetQDInstrument(QDI_DYNACOOL_TYPE, False, ip_address, DEFAULT_PORT)
+       self._last_snapshot = None
+       self._last_snapshot_ts = 0.0
 
     def read_temp(self):
         # Temperature in Kelvin
@@ -80,45 +113,48 @@ class Dynacool:
         
     def read_position_status(self):
         resp = self.qdi_instrument.GetPosition("Horizontal Rotator", 0, 0)[2]    
-        options = ['Position unknown', 'At target', 'Unused2', 'Unused3', 'Unused4', 'Moving', 'Unused6',
-                   'Unused7', 'At limit switch', 'At index switch', 'Unused10', 'Unused11', 'Unused12',
-                   'Unused13', 'Unused14', 'Position failure']
-        return options[resp]
+        return POSITION_STATUS[resp]
         
     def read_chamber_status(self):
         resp = self.qdi_instrument.GetChamber(0)[1]
-        options = ['Chamber unknown', 'Purged and sealed', 'Vented and sealed', 'Sealed', 'Purging', 'Venting',
-                   'PreHiVac', 'HighVac', 'PumpContinuous', 'VentContinuous', 'Unused10', 'Unused11', 'Unused12',
-                   'Unused13', 'Unused14', 'Chamber failure']
-        return options[resp]
+        return CHAMBER_STATUS[resp]
     
     def read_temp_status(self):
         resp = self.qdi_instrument.GetTemperature(0, 0)[2]
-        options = ['Temperature unknown', 'Stable', 'Tracking', 'Unused3', 'Unused4', 'Near', 'Chasing', 'Filling',
-                   'Unused8', 'Unused9', 'Standby', 'Unused11', 'Unused12', 'Disabled', 'Impedance not functioning', 'Temperature failure']
-        return options[resp]
+        return TEMP_STATUS[resp]
     
     def read_fvalue_status(self):
         resp = self.qdi_instrument.GetField(0, 0)[2]
-        options = ['Magnet unknown', 'Stable and persistent', 'Warming switch', 'Cooling switch', 'Stable and driven', 'Iterating', 'Charging'
-                   'Discharging', 'Current error', 'Unused9', 'Unused10', 'Unused11', 'Unused12', 'Unused13', 'Unused14', 'Magnet failure']
-        return options[resp]
+        return FIELD_STATUS[resp]
     
     def read_chamber_temp(self):
         resp = self.qdi_instrument.ReadSDO_F32(3, 6001, 4)
         return resp
+
+    def _snapshot(self):
+        # Temperature, field and chamber state with one call each, instead of one call per value.
+        # Calls within SNAPSHOT_TTL reuse the previous result.
+        now = time.monotonic()
+        if self._last_snapshot is None or now - self._last_snapshot_ts > SNAPSHOT_TTL:
+            t = self.qdi_instrument.GetTemperature(0, 0)
+            f = self.qdi_instrument.GetField(0, 0)
+            c = self.qdi_instrument.GetChamber(0)
+            self._last_snapshot = Snapshot(t[1], t[2], f[1], f[2], c[1])
+            self._last_snapshot_ts = now
+        return self._last_snapshot
         
     def status(self):
+        snap = self._snapshot()
         print('DynaCool system status:')
         print('--------------------------------------')
-        print('Temperature  : ' + str(self.read_temp()) + ' K.')
-        print('     Status  : ' + self.read_temp_status())
-        print('      Field  : ' + str(self.read_fvalue()) + ' Oe.')
-        print('     Status  : ' + self.read_fvalue_status())
+        print('Temperature  : ' + str(snap.temp) + ' K.')
+        print('     Status  : ' + TEMP_STATUS[snap.temp_status])
+        print('      Field  : ' + str(snap.field) + ' Oe.')
+        print('     Status  : ' + FIELD_STATUS[snap.field_status])
         try:
             print('   Position  : ' + str(self.read_position()) + ' deg.')
             print('     Status  : ' + self.read_position_status())
         except Exception:
             print( '    (!)        The rotator is not activated/installed!')
-        print('    Chamber  : ' + self.read_chamber_status())
+        print('    Chamber  : ' + CHAMBER_STATUS[snap.chamber_status])
         print('--------------------------------------')
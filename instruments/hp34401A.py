@@ -11,7 +11,14 @@ University of Twente
 daan@daanwielens.com
 """
 
-import pyvisa as visa
+from . import _visa
+import numpy as np
+
+def _imp_auto(val):
+    # INP:IMP:AUTO accepts 0/1 as well as OFF/ON; settings are compared and sent as 0 or 1
+    if isinstance(val, str) and val.strip().upper() in ('ON', 'OFF'):
+        return int(val.strip().upper() == 'ON')
+    return int(val)
 
 class WrongInstrErr(Exception):
     """
@@ -21,40 +28,91 @@ class WrongInstrErr(Exception):
     """
     pass
 
-class hp34401A:
+class hp34401A(_visa.LockedQueries):
     type = 'HP 34401A Multimeter'
 
     def __init__(self, GPIBaddr):
-        rm = visa.ResourceManager()
-        self.visa = rm.open_resource('GPIB0::{}::INSTR'.format(GPIBaddr))
+        # Let pyvisa handle the line endings, such that responses need no stripping
+        self.visa = _visa.open_gpib(GPIBaddr, read_termination='\n', write_termination='\n', timeout=2000)
         # Check if device is really a Keithley 2000
         resp = self.visa.query('*IDN?')
         model = resp.split(',')[1]
         if model != '34401A':
             raise WrongInstrErr('Expected HP 34401A, got {}'.format(resp))
+        self._init_lock()
+        # Last input impedance setting written, see write_dcInputImp. MEAS, CONF and *RST reset the
+        # input impedance on the instrument, so every function sending those clears it again.
+        self._last_imp = None
 
     def get_iden(self):
-        resp = str(self.visa.query('*IDN?'))
+        resp = str(self._query('*IDN?'))
         return resp
 
     def close(self):
         self.visa.close()
 
     def read_dcv(self):
-        resp = float(self.visa.query('READ?'))
+        resp = float(self._query('READ?'))
         return resp
 
     def query(self, val):
-        resp = self.visa.query(val).strip('\n')
+        # Any command may be sent here, so forget the input impedance setting
+        self._last_imp = None
+        resp = self._query(val)
         return resp
 
     def read_dcInputImp(self):
-        resp = int(self.visa.query('INP:IMP:AUTO?'))
+        resp = int(self._query('INP:IMP:AUTO?'))
+        self._last_imp = resp
         return resp
 
     def write_dcInputImp(self, val):
-        self.visa.write('INP:IMP:AUTO ' + str(val))
+        # Switching the input impedance is slow, so skip it if this setting was already sent
+        ival = _imp_auto(val)
+        with self._lock:
+            if ival != self._last_imp:
+                self.visa.write(f'INP:IMP:AUTO {ival}')
+                self._last_imp = ival
 
     def read_dcv_fast(self):
-        resp = float(self.visa.query('MEAS:VOLT:DC? DEF, Max')) # Chuan: using max resolution to get a fast measurement
+        self._last_imp = None
+        resp = float(self._query('MEAS:VOLT:DC? DEF, Max')) # Chuan: using max resolution to get a fast measurement
+        return resp
+
+    def arm_dcv_burst(self, N):
+        # Configure once for N fast DC voltage readings, which are taken on the trigger of
+        # fetch_dcv_burst. The reading memory holds at most 512 readings.
+        N = int(N)
+        if not 1 <= N <= 512:
+            raise ValueError('The number of readings should be between 1 and 512.')
+        with self._lock:
+            self._last_imp = None
+            self.visa.write('CONF:VOLT:DC DEF,MAX')
+            self.visa.write(f'SAMP:COUN {N}')
+            self.visa.write('TRIG:SOUR BUS')
+            self.visa.write('INIT')
+
+    def fetch_dcv_burst(self):
+        # Trigger the readings armed by arm_dcv_burst and return them as numpy array.
+        # The 34401A only returns ASCII data, which pyvisa converts in one go.
+        with self._lock:
+            try:
+                self.visa.write('*TRG')
+                resp = self.visa.query_ascii_values('FETC?', container=np.ndarray)
+            finally:
+                # Back to single, immediate readings for read_dcv
+                self.visa.write('SAMP:COUN 1')
+                self.visa.write('TRIG:SOUR IMM')
         return resp
+
+    async def aread_dcv(self):
+        return float(await self._aquery('READ?'))
+
+    async def aread_dcInputImp(self):
+        resp = int(await self._aquery('INP:IMP:AUTO?'))
+        self._last_imp = resp
+        return resp
+
+    async def aread_dcv_fast(self):
+        self._last_imp = None
+        return float(await self._aquery('MEAS:VOLT:DC? DEF, Max'))
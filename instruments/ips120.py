@@ -12,6 +12,40 @@ daan@daanwielens.com
 """
 
 import pyvisa as visa
+from . import _visa
+import time
+
+# Removes the 'R' echo, '+' sign and line endings from responses, see read_fvalue
+_TRIM = str.maketrans('', '', 'R+\r\n ')
+
+# Meaning of the status characters in the response to 'X', see status
+_SYS1 = {'0': 'normal', '1': 'quenched', '2': 'over heated', '4': 'warming up', '8': 'fault'}
+_SYS2 = {'0': 'normal', '1': 'on positive voltage limit', '2': 'on negative voltage limit',
+         '4': 'outside negative current limit', '8': 'outside positive current limit'}
+_ACT = {'0': 'hold', '1': 'to set point', '2': 'to zero', '4': 'clamped'}
+_LOCREM = {'0': 'local & locked', '1': 'remote & locked', '2': 'local & unlocked', '3': 'remote & unlocked',
+           '4': 'auto-run-down', '5': 'auto-run-down', '6': 'auto-run-down', '7': 'auto-run-down'}
+_HEATER = {'0': 'off magnet at zero (switch closed)', '1': 'on (switch open)', '2': 'off magnet at field (switch closed)',
+           '5': 'heater fault (heater is on but current is low)', '8': 'no switch fitted'}
+_DISP1 = {'0': 'amps (magnet sweep: fast)', '1': 'tesla (magnet sweep: fast)',
+          '4': 'amps (magnet sweep: slow)', '5': 'tesla (magnet sweep: slow)'}
+_DISP2 = {'0': 'at rest', '1': 'sweeping', '2': 'sweep limiting', '3': 'sweeping & sweep limiting'}
+
+def _status_text(table, code):
+    return table.get(code, 'unknown (' + code + ')')
+
+_STATUS_TEMPLATE = '\n'.join(['--------------------------------------------------------------',
+                              'Oxford IPS120-10 Magnet Power Supply',
+                              '  System status 1: {}',
+                              '  System status 2: {}',
+                              '  Activity:        {}',
+                              '  Loc/rem status:  {}',
+                              '  Switch heater:   {}',
+                              '  Display mode 1:  {}',
+                              '  Display mode 2:  {}',
+                              '--------------------------------------------------------------'])
+# Position of each status character in the XmnAnCnHnMmnPmn string, with its table
+_STATUS_FIELDS = ((1, _SYS1), (2, _SYS2), (4, _ACT), (6, _LOCREM), (8, _HEATER), (10, _DISP1), (11, _DISP2))
 
 class WrongInstrErr(Exception):
     """
@@ -21,156 +55,130 @@ class WrongInstrErr(Exception):
     """
     pass
 
-class ips120:
+class ips120(_visa.LockedQueries):
     type = 'Oxford IPS120-10 Magnet Controller'
 
     def __init__(self, GPIBaddr):
-        rm = visa.ResourceManager()
-        self.visa = rm.open_resource('GPIB0::{}::INSTR'.format(GPIBaddr))
         # The magnet controller neads a specific read termination:
-        self.visa.read_termination = '\r'
+        self.visa = _visa.open_gpib(GPIBaddr, read_termination='\r')
         # Check if device is really an Oxford IPS120-10 Magnet Controller
         resp = self.visa.query('V')
         model = resp.split(' ')[0]
         if model != 'IPS120-10':
             raise WrongInstrErr('Expected Oxford IPS120-10, got {}'.format(resp))
+        self._init_lock()
 
     def get_iden(self):
-        resp = str(self.visa.query('V'))
+        resp = str(self._query('V'))
         return resp
 
     def close(self):
         self.visa.close()
 
+    def _send(self, cmd):
+        # A '$' prefix tells the IPS120 not to send a reply, so a plain write suffices
+        with self._lock:
+            self.visa.write('$' + cmd)
+
     def unlock(self):
-        self.visa.query('C 3')
+        self._send('C 3')
 
     def read_fvalue(self):
-        resp = float(self.visa.query('R 7').strip('R+').replace('+','').strip('\n').strip('\r'))
+        resp = float(self._query('R 7').translate(_TRIM))
         return resp
 
     def write_fvalue(self, val):
         fval = float(val)
-        self.visa.query('J ' + str(fval))
-        # This only sets the field, but does not actually tell the magnet to go there. Thus:
-        self.visa.query('A 1')
+        with self._lock:
+            self._send(f'J {fval}')
+            # This only sets the field, but does not actually tell the magnet to go there. Thus:
+            self._send('A 1')
 
     def write_gotozero(self):
-        self.visa.query('A 2')
+        self._send('A 2')
 
     def read_rate(self):
-        resp = float(self.visa.query('R 9').strip('R+').replace('+','').strip('\n').strip('\r'))
+        resp = float(self._query('R 9').translate(_TRIM))
         return resp
 
     def write_rate(self, val):
         fval = float(val)
-        self.visa.query('T ' + str(fval))
+        self._send(f'T {fval}')
 
     def hold(self):
-        self.visa.query('A 0')
+        self._send('A 0')
 
     def clamp(self):
-        self.visa.query('A 4')
+        self._send('A 4')
 
     def hON(self):
-        self.visa.query('H 1')
+        self._send('H 1')
 
     def hOFF(self):
-        self.visa.query('H 0')
+        self._send('H 0')
 
     def read_setp(self):
-        resp = float(self.visa.query('R 8').strip('R+').replace('+','').strip('\n').strip('\r'))
+        resp = float(self._query('R 8').translate(_TRIM))
         return resp
 
     def query(self, val):
-        resp = self.visa.query(val)
+        resp = self._query(val)
         return resp
 
+    def read_sweeping(self):
+        # Display mode 2 (last character of the X status) is '0' when the magnet is at rest
+        resp = self._query('X')
+        return resp.split('M')[1][1] != '0'
+
+    def wait_at_setpoint(self, timeout=60, poll=0.5):
+        # Block until the magnet is at rest. Waits for a service request between status checks
+        # where the backend supports it, otherwise falls back to polling every <poll> seconds.
+        # Returns False if the magnet is still sweeping after <timeout> seconds.
+        SRQ = visa.constants.EventType.service_request
+        QUEUE = visa.constants.EventMechanism.queue
+        try:
+            self.visa.enable_event(SRQ, QUEUE)
+            use_srq = True
+        except (visa.VisaIOError, NotImplementedError):
+            use_srq = False
+        deadline = time.monotonic() + timeout
+        try:
+            while self.read_sweeping():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if use_srq:
+                    try:
+                        self.visa.wait_on_event(SRQ, int(1000 * min(remaining, poll)))
+                    except visa.VisaIOError:
+                        pass
+                else:
+                    time.sleep(min(remaining, poll))
+            return True
+        finally:
+            if use_srq:
+                self.visa.disable_event(SRQ, QUEUE)
+
     def read_heater(self):
-        resp = int(self.visa.query('X').split('H')[1][0])
+        resp = int(self._query('X').split('H')[1][0])
         return resp
 
     def status(self):
-        resp = self.visa.query('X')
-        print('--------------------------------------------------------------')
-        print('Oxford IPS120-10 Magnet Power Supply')
-
-        # We digest the XmnAnCnHnMmnPmn string piece by piece
-        if resp[1] == '0':
-            print('  System status 1: normal')
-        elif resp[1] == '1':
-            print('  System status 1: quenched')
-        elif resp[1] == '2':
-            print('  System status 1: over heated')
-        elif resp[1] == '4':
-            print('  System status 1: warming up')
-        elif resp[1] == '8':
-            print('  System status 1: fault')
-
-        if resp[2] == '0':
-            print('  System status 2: normal')
-        elif resp[2] == '1':
-            print('  System status 2: on positive voltage limit')
-        elif resp[2] == '2':
-            print('  System status 2: on negative voltage limit')
-        elif resp[2] == '4':
-            print('  System status 2: outside negative current limit')
-        elif resp[2] == '8':
-            print('  System status 2: outside positive current limit')
-
-        if resp[4] == '0':
-            print('  Activity:        hold')
-        elif resp[4] == '1':
-            print('  Activity:        to set point')
-        elif resp[4] == '2':
-            print('  Activity:        to zero')
-        elif resp[4] == '4':
-            print('  Activity:        clamped')
-
-        if resp[6] == '0':
-            print('  Loc/rem status:  local & locked')
-        elif resp[6] == '1':
-            print('  Loc/rem status:  remote & locked')
-        elif resp[6] == '2':
-            print('  Loc/rem status:  local & unlocked')
-        elif resp[6] == '3':
-            print('  Loc/rem status:  remote & unlocked')
-        elif resp[6] == '4':
-            print('  Loc/rem status:  auto-run-down')
-        elif resp[6] == '5':
-            print('  Loc/rem status:  auto-run-down')
-        elif resp[6] == '6':
-            print('  Loc/rem status:  auto-run-down')
-        elif resp[7] == '0':
-            print('  Loc/rem status:  auto-run-down')
-
-        if resp[8] == '0':
-            print('  Switch heater:   off magnet at zero (switch closed)')
-        elif resp[8] == '1':
-            print('  Switch heater:   on (switch open)')
-        elif resp[8] == '2':
-            print('  Switch heater:   off magnet at field (switch closed)')
-        elif resp[8] == '5':
-            print('  Switch heater:   heater fault (heater is on but current is low)')
-        elif resp[8] == '8':
-            print('  Switch heater:   no switch fitted')
-
-        if resp[10] == '0':
-            print('  Display mode 1:  amps (magnet sweep: fast)')
-        elif resp[10] == '1':
-            print('  Display mode 1:  tesla (magnet sweep: fast)')
-        elif resp[10] == '4':
-            print('  Display mode 1:  amps (magnet sweep: slow)')
-        elif resp[10] == '5':
-            print('  Display mode 1:  tesla (magnet sweep: slow)')
-
-        if resp[11] == '0':
-            print('  Display mode 2:  at rest')
-        elif resp[11] == '1':
-            print('  Display mode 2:  sweeping')
-        elif resp[11] == '2':
-            print('  Display mode 2:  sweep limiting')
-        elif resp[11] == '3':
-            print('  Display mode 2:  sweeping & sweep limiting')
-
-        print('--------------------------------------------------------------')
+        resp = self._query('X')
+        print(_STATUS_TEMPLATE.format(*[_status_text(table, resp[i]) for i, table in _STATUS_FIELDS]))
+
+    async def aread_fvalue(self):
+        resp = await self._aquery('R 7')
+        return float(resp.translate(_TRIM))
+
+    async def aread_rate(self):
+        resp = await self._aquery('R 9')
+        return float(resp.translate(_TRIM))
+
+    async def aread_setp(self):
+        resp = await self._aquery('R 8')
+        return float(resp.translate(_TRIM))
+
+    async def aread_heater(self):
+        resp = await self._aquery('X')
+        return int(resp.split('H')[1][0])
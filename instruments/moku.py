@@ -22,8 +22,25 @@ The Moku equipment requires additional software to be installed:
 from moku.instruments import MultiInstrument
 from moku.instruments import Oscilloscope
 from moku.instruments import WaveformGenerator
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+# Adds ch * inv_n to the running averages. Compiled with numba when it is installed,
+# such that the add and scale are done in a single vectorised pass. The compiled loop does
+# not check the array sizes, so the caller makes sure that they match.
+try:
+    from numba import njit
+except ImportError:
+    def _fold(acc1, acc2, ch1, ch2, inv_n):
+        acc1 += ch1 * inv_n
+        acc2 += ch2 * inv_n
+else:
+    @njit(cache=True, fastmath=True)
+    def _fold(acc1, acc2, ch1, ch2, inv_n):
+        for i in range(acc1.shape[0]):
+            acc1[i] += ch1[i] * inv_n
+            acc2[i] += ch2[i] * inv_n
+
 class moku:
     type = 'Moku'
     
@@ -192,10 +209,12 @@ class moku:
         self.osc.osc_measurement(t1=t1, t2=t2, trigger_source=trigger_source, edge=edge, level=level) 
         self.osc.set_acquisition_mode(acquisition_mode)
         # Number of points needs to be 2^n where n is in between 7 (128 points) and 14 (16384 points). If the given 'npoints' is not 2^n with integer n, round to nearest (larger) n.
-        npoints = 2**int(np.ceil(np.log(npoints)/np.log(2)))
+        npoints = 1 << max(7, (int(npoints) - 1).bit_length())
+        if npoints > 16384:
+            raise ValueError('The number of points can be at most 16384.')
         self.osc.set_timebase(t1=t1, t2=t2, frame_length=npoints)  
         
-    def single_wg_osc_get_wav_navg(self, n_avg=16):
+    def single_wg_osc_get_wav_navg(self, n_avg=16, keep_individual=False):
         '''
         This function retrieves waveforms from the oscilloscope. It takes n_avg samples and then averages these to improve SNR.
 
@@ -203,6 +222,9 @@ class moku:
         ----------
         n_avg : int, optional
             Number of curves that will be taken for averaging. The default is 16.
+        keep_individual : bool, optional
+            If True, all curves are stored before averaging (n_avg times the memory). If False (default),
+            the curves are summed on the fly. The default is False.
 
         Returns
         -------
@@ -212,24 +234,49 @@ class moku:
             Voltages of the second channel of the oscilloscope (Input 1).
 
         '''
-        V1_list = np.array([], dtype=np.float64)
-        V2_list = np.array([], dtype=np.float64)
-        for i in range(n_avg):
-            data = self.osc.get_data()
-            print(np.count_nonzero(data['ch1']))
-            if len(V1_list) == 0:
-                V1_list = data['ch1']
-                V2_list = data['ch2']
-            else:
-                V1_list = np.vstack((V1_list, data['ch1']))
-                V2_list = np.vstack((V2_list, data['ch2']))
+        if not keep_individual:
+            # Running average, allocated once the number of points is known
+            acc1 = None
+            acc2 = None
+            inv_n = 1.0 / n_avg
+            for data in self._osc_frames(n_avg):
+                ch1 = np.asarray(data['ch1'], dtype=np.float64)
+                ch2 = np.asarray(data['ch2'], dtype=np.float64)
+                if acc1 is None:
+                    acc1 = np.zeros_like(ch1)
+                    acc2 = np.zeros_like(ch2)
+                if ch1.shape != acc1.shape or ch2.shape != acc2.shape:
+                    raise ValueError('The number of points changed while averaging.')
+                _fold(acc1, acc2, ch1, ch2, inv_n)
+            return acc1, acc2
+        # One row per curve, allocated once the number of points is known
+        V1_list = None
+        V2_list = None
+        for i, data in enumerate(self._osc_frames(n_avg)):
+            ch1 = np.asarray(data['ch1'], dtype=np.float64)
+            if V1_list is None:
+                V1_list = np.empty((n_avg, ch1.size), dtype=np.float64)
+                V2_list = np.empty_like(V1_list)
+            V1_list[i] = ch1
+            V2_list[i] = data['ch2']
         if n_avg > 1:
             V1 = np.mean(V1_list, 0)
             V2 = np.mean(V2_list, 0)
             return V1, V2
         else:
-            return V1_list, V2_list
+            return V1_list[0], V2_list[0]
     
+    def _osc_frames(self, n):
+        # Yields n frames from the oscilloscope. The next frame is already requested in a worker
+        # thread while the caller processes the current one, hiding the transfer time.
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            fut = ex.submit(self.osc.get_data)
+            for i in range(n):
+                data = fut.result()
+                if i + 1 < n:
+                    fut = ex.submit(self.osc.get_data)
+                yield data
+
     def get_moku_data(self):
         return self.osc.get_data()
     
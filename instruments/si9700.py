@@ -11,7 +11,7 @@ University of Twente
 daan@daanwielens.com
 """
 
-import pyvisa as visa
+from . import _visa
 
 class WrongInstrErr(Exception):
     """
@@ -25,8 +25,7 @@ class si9700:
     type = 'Scientific Instruments 9700 Temperature Controller'
 
     def __init__(self, GPIBaddr):
-        rm = visa.ResourceManager()
-        self.visa = rm.open_resource('GPIB0::{}::INSTR'.format(GPIBaddr))
+        self.visa = _visa.open_gpib(GPIBaddr)
         # Check if device is really a Scientific Instruments 9700 Controller
         resp = self.visa.query('*IDN?')
         model = resp.split(',')[1]
@@ -11,11 +11,30 @@ University of Twente
 daan@daanwielens.com
 """
 
-import pyvisa as visa
+from . import _visa
 import time
-import numpy as np
+import asyncio
 import bisect as bisect
 
+def _dac_functions(n):
+    # read_dacN, write_dacN and aread_dacN for aux output n, which only differ in the channel number
+    write_tmpl = b'AUXV%d, %%r\n' % n
+
+    def read_dac(self):
+        resp = float(self._query(f'AUXV?{n}'))
+        return resp
+
+    def write_dac(self, val):
+        fval = float(val)
+        self._write_raw(write_tmpl % fval)
+
+    async def aread_dac(self):
+        return float(await self._aquery(f'AUXV?{n}'))
+
+    for func in (read_dac, write_dac, aread_dac):
+        func.__name__ = func.__qualname__ = func.__name__ + str(n)
+    return read_dac, write_dac, aread_dac
+
 class WrongInstrErr(Exception):
     """
     A connection was established to the instrument, but the instrument
@@ -24,198 +43,246 @@ class WrongInstrErr(Exception):
     """
     pass
 
-class sr830:
+class sr830(_visa.LockedQueries):
     type = 'Stanford Research 830 Lock-In Amplifier'
+    # Sensitivities (V) and time constants (s) by SENS / OFLT index
+    _SENS = (2e-9, 5e-9, 1e-8, 2e-8, 5e-8, 1e-7, 2e-7, 5e-7, 1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 1e-1, 2e-1, 5e-1, 1)
+    _TAU = (10e-6, 30e-6, 100e-6, 300e-6, 1e-3, 3e-3, 10e-3, 30e-3, 100e-3, 300e-3, 1, 3, 10, 30, 100, 300, 1e3, 3e3, 10e3, 30e3)
+    # Time constants needed to settle within 1% for the 6, 12, 18 and 24 dB/oct filter slopes (OFSL index)
+    _SETTLE = (5, 7, 9, 10)
+    # Commands sent by _write_cached, as bytes for write_raw; they include the write termination set in __init__
+    _WRITE_TMPL = {'SLVL': b'SLVL %r\n', 'FREQ': b'FREQ %r\n', 'PHAS': b'PHAS %r\n', 'SENS': b'SENS %d\n', 'OFLT': b'OFLT %d\n'}
 
     def __init__(self, GPIBaddr):
-        rm = visa.ResourceManager()
-        self.visa = rm.open_resource('GPIB0::{}::INSTR'.format(GPIBaddr))
+        # Let pyvisa handle the line endings, such that responses need no stripping
+        self.visa = _visa.open_gpib(GPIBaddr, read_termination='\n', write_termination='\n', timeout=2000)
         self.GPIBnum = GPIBaddr
         # Check if device is really a sr830 lock-in
         resp = self.visa.query('*IDN?')
         model = resp.split(',')[1]
         if model != 'SR830':
             raise WrongInstrErr('Expected sr830 Lock-In Amplifier, got {}'.format(resp))
+        self._iden = resp
+        self._init_lock()
+        # Last value written or read per setting, see _write_cached
+        self._last = {}
 
     def get_iden(self):
-        resp = str(self.visa.query('*IDN?'))
-        return resp
+        return self._iden
 
     def close(self):
         self.visa.close()
 
+    def _write_cached(self, cmd, val):
+        # Skip the write when this value was already sent, e.g. the same sensitivity at every point
+        # of a sweep. Settings changed on the front panel are not seen; call clear_cache() after that.
+        with self._lock:
+            if self._last.get(cmd) != val:
+                self.visa.write_raw(self._WRITE_TMPL[cmd] % val)
+                self._last[cmd] = val
+
+    def clear_cache(self):
+        self._last.clear()
+
+    def _query_multi(self, cmds):
+        # Several queries in one semicolon-chained message; the answers may come back joined by ';'
+        # or one per line
+        with self._lock:
+            self.visa.write(';'.join(cmds))
+            resp = self.visa.read().split(';')
+            while len(resp) < len(cmds):
+                resp.append(self.visa.read())
+        return resp
+
+    def _write_raw(self, msg):
+        with self._lock:
+            self.visa.write_raw(msg)
+
     def read_x(self):
-        resp = float(self.visa.query('OUTP?1').strip('\n').strip('\r'))
+        resp = float(self._query('OUTP?1'))
         return resp
 
     def read_y(self):
-        resp = float(self.visa.query('OUTP?2').strip('\n').strip('\r'))
+        resp = float(self._query('OUTP?2'))
         return resp
 
     def read_r(self):
-        resp = float(self.visa.query('OUTP?3').strip('\n').strip('\r'))
+        resp = float(self._query('OUTP?3'))
         return resp
 
     def read_theta(self):
-        resp = float(self.visa.query('OUTP?4').strip('\n').strip('\r'))
+        resp = float(self._query('OUTP?4'))
         return resp
     
+    def read_xy(self):
+        # X and Y from the same moment, in one query
+        resp = self._query('SNAP?1,2').split(',')
+        return float(resp[0]), float(resp[1])
+
+    def read_xyrtheta(self):
+        # X, Y, R and theta from the same moment, in one query
+        resp = self._query('SNAP?1,2,3,4').split(',')
+        return float(resp[0]), float(resp[1]), float(resp[2]), float(resp[3])
+    
     def read_auxin1(self):
-        resp = float(self.visa.query('OAUX?1').strip('\n').strip('\r'))
+        resp = float(self._query('OAUX?1'))
         return resp
     
     def read_freq(self):
-        resp = float(self.visa.query('FREQ?').strip('\n').strip('\r'))
+        resp = float(self._query('FREQ?'))
         return resp
 
     def read_amp(self):
-        resp = float(self.visa.query('SLVL?').strip('\n').strip('\r'))
+        resp = float(self._query('SLVL?'))
         return resp
 
     def write_amp(self, val):
         fval = float(val)
-        self.visa.write('SLVL ' + str(fval) + '\n')
+        self._write_cached('SLVL', fval)
 
     def write_freq(self, val):
         fval = float(val)
-        self.visa.write('FREQ ' + str(fval) + '\n')
+        self._write_cached('FREQ', fval)
 
     def read_phase(self):
-        resp = float(self.visa.query('PHAS?').strip('\n').strip('\r'))
+        resp = float(self._query('PHAS?'))
         return resp
 
     def write_phase(self, val):
         fval = float(val)
-        self.visa.write('PHAS ' + str(fval) + '\n')
+        self._write_cached('PHAS', fval)
 
     def read_sens(self):
-        resp = int(self.visa.query('SENS?').strip('\n').strip('\r'))
+        resp = int(self._query('SENS?'))
+        # Keep the write cache in step with the instrument
+        self._last['SENS'] = resp
         return resp
     
     def write_sens(self, val):
-        ival = float(val)
-        self.visa.write('SENS ' + str(ival) + '\n')
+        ival = int(val)
+        self._write_cached('SENS', ival)
 
     def read_tau(self):
-        resp = int(self.visa.query('OFLT?').strip('\n').strip('\r'))
+        resp = int(self._query('OFLT?'))
+        self._last['OFLT'] = resp
         return resp
     
     def write_tau(self, val):
-        ival = float(val)
-        self.visa.write('OFLT ' + str(ival) + '\n')
+        ival = int(val)
+        self._write_cached('OFLT', ival)
         
     def read_harm(self):
-        resp = int(self.visa.query('HARM?').strip('\n').strip('\r'))
+        resp = int(self._query('HARM?'))
         return resp
     
     def write_harm(self, val):
-        ival = float(val)
-        self.visa.write('HARM ' + str(ival) + '\n')
-
-    def read_dac1(self):
-        resp = float(self.visa.query('AUXV?1').strip('\n').strip('\r'))
-        return resp
-
-    def write_dac1(self, val):
-        fval = float(val)
-        self.visa.write('AUXV1, ' + str(fval) + '\n')
+        ival = int(val)
+        self._write_raw(b'HARM %d\n' % ival)
 
-    def read_dac2(self):
-        resp = float(self.visa.query('AUXV?2').strip('\n').strip('\r'))
-        return resp
-
-    def write_dac2(self, val):
-        fval = float(val)
-        self.visa.write('AUXV2, ' + str(fval) + '\n')
+    def read_auxin_all(self):
+        # Aux inputs 1-4 in one SNAP? transaction
+        resp = self._query('SNAP?5,6,7,8').split(',')
+        return float(resp[0]), float(resp[1]), float(resp[2]), float(resp[3])
 
-    def read_dac3(self):
-        resp = float(self.visa.query('AUXV?3').strip('\n').strip('\r'))
-        return resp
+    def read_dac_all(self):
+        # Aux outputs 1-4 in one compound message
+        resp = self._query_multi(('AUXV?1', 'AUXV?2', 'AUXV?3', 'AUXV?4'))
+        return float(resp[0]), float(resp[1]), float(resp[2]), float(resp[3])
 
-    def write_dac3(self, val):
-        fval = float(val)
-        self.visa.write('AUXV3, ' + str(fval) + '\n')
+    # Aux outputs 1-4, see _dac_functions
+    read_dac1, write_dac1, aread_dac1 = _dac_functions(1)
+    read_dac2, write_dac2, aread_dac2 = _dac_functions(2)
+    read_dac3, write_dac3, aread_dac3 = _dac_functions(3)
+    read_dac4, write_dac4, aread_dac4 = _dac_functions(4)
 
-    def read_dac4(self):
-        resp = float(self.visa.query('AUXV?4').strip('\n').strip('\r'))
-        return resp
-
-    def write_dac4(self, val):
-        fval = float(val)
-        self.visa.write('AUXV4, ' + str(fval) + '\n')
-        
     def read_coupl(self):
-        resp = int(self.visa.query('ICPL?').strip('\n').strip('\r'))
+        resp = int(self._query('ICPL?'))
         return resp
 
     def write_coupl(self, val):
         fval = int(val)
-        self.visa.write('ICPL ' + str(fval) + '\n')
+        self._write_raw(b'ICPL %d\n' % fval)
 
     def read_auto_x(self):
-        # Get data. We use the R value here!
-        rval = float(self.visa.query('OUTP?3').strip('\n').strip('\r'))
-        cur_sens = int(self.visa.query('SENS?').strip('\n').strip('\r'))
-        sens = np.array([2e-9, 5e-9, 1e-8, 2e-8, 5e-8, 1e-7, 2e-7, 5e-7, 1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 1e-1, 2e-1, 5e-1, 1])
-        sens_val = sens[cur_sens]
-        # Change sensitivity if necessary
+        # Get data. We use the R value here! X and R are sampled together with SNAP?. If R is within
+        # range (the usual case), X is returned right away from that same snapshot
+        xval, rval = [float(v) for v in self._query('SNAP?1,3').split(',')]
+        # Read the sensitivity once per call, such that changes on the front panel are picked up
+        cur_sens = self.read_sens()
+        sens = self._SENS
+        # Change sensitivity if necessary. Within this call the sensitivity is only changed by us, so
+        # cur_sens is not read back after writing it. Instead of stepping one range at a time, jump
+        # to the range that fits R directly; this repeats only if R was clipped by an overload
         changed = 0
-        while abs(rval) > 0.9*sens_val:
-            changed = 1
-            cur_sens += 1
-            self.visa.write('SENS ' + str(cur_sens) + '\n')
-            time.sleep(5) # System must stabilise again
-            rval = float(self.visa.query('OUTP?3').strip('\n').strip('\r'))
-            cur_sens = int(self.visa.query('SENS?').strip('\n').strip('\r'))
-            sens_val = sens[cur_sens]
-        while abs(rval) < 0.1*sens_val:
+        settle = None
+        while True:
+            if abs(rval) > 0.9*sens[cur_sens]:
+                target = min(bisect.bisect_left(sens, abs(rval)/0.9), len(sens) - 1)
+            elif abs(rval) < 0.1*sens[cur_sens]:
+                target = max(bisect.bisect_right(sens, 10*abs(rval)) - 1, 0)
+            else:
+                break
+            if target == cur_sens:
+                # Already at the end of the range
+                break
             changed = 1
-            cur_sens -= 1
-            self.visa.write('SENS ' + str(cur_sens) + '\n')
-            time.sleep(5) # System must stabilise again
-            rval = float(self.visa.query('OUTP?3').strip('\n').strip('\r'))
-            cur_sens = int(self.visa.query('SENS?').strip('\n').strip('\r'))
-            sens_val = sens[cur_sens]
+            cur_sens = target
+            self.write_sens(cur_sens)
+            # System must stabilise again: 5 time constants, but never more than the 5 s used before.
+            # The time constant is read at the first change only.
+            if settle is None:
+                settle = min(max(5*self._TAU[self.read_tau()], 0.05), 5)
+            time.sleep(settle)
+            xval, rval = [float(v) for v in self._query('SNAP?1,3').split(',')]
+        sens_val = sens[cur_sens]
 
         #Notify user
         if changed == 1:
             print(' <!> Changed lock-in (GPIB: ' + str(self.GPIBnum) + ') sensitivity to ' + str(sens_val) + ' V.')
 
-        # Return x-value to user
-        xval = float(self.visa.query('OUTP?1').strip('\n').strip('\r'))
+        # Return x-value to user, taken in the same SNAP? as the last R value
         return xval
     
     def write_auto_tau(self):
-        tau = np.array([10e-6, 30e-6, 100e-6, 300e-6, 1e-3, 3e-3, 10e-3, 30e-3, 100e-3, 300e-3, 1, 3, 10, 30, 100, 300, 1e3, 3e3, 10e3, 30e3])
-        cur_freq = self.read_freq()
-        cur_tau_i = self.read_tau()
+        tau = self._TAU
+        resp = self._query_multi(('FREQ?', 'OFLT?'))
+        cur_freq = float(resp[0])
+        cur_tau_i = int(resp[1])
+        self._last['OFLT'] = cur_tau_i
         
         #Calculate desired time constant: as hard lower limit: average over 10 oscillations of signal
         tau_target = 10*1/cur_freq
         
         #Set time constant to closest desired value: first to equal or exceed desired value
               
-        #Find correct index for tau            
-        i_tau = bisect.bisect_right(tau, tau_target)
-        if tau[i_tau - 1]== tau_target:
-            i_tau = i_tau - 1          
+        #Find correct index for tau, limited to the longest time constant
+        i_tau = min(bisect.bisect_left(tau, tau_target), len(tau) - 1)
         
         #Check if tau needs to be changed
         if i_tau != cur_tau_i:
             tau_val = tau[i_tau]
             self.write_tau(i_tau)
             print(' <!> Changed lock-in (GPIB: ' + str(self.GPIBnum) + ') timescale to ' + str(tau_val) + ' s.')
-            
+        # Return the frequency and (new) time constant index, such that callers need not read them again
+        return cur_freq, i_tau
+
     def read_x_autotau(self):
-       self.write_auto_tau()
+       cur_freq, i_tau = self.write_auto_tau()
        # Turn off auto coupling, force current setting (AC)
        #self.write_auto_coupl()
-       tau = np.array([10e-6, 30e-6, 100e-6, 300e-6, 1e-3, 3e-3, 10e-3, 30e-3, 100e-3, 300e-3, 1, 3, 10, 30, 100, 300, 1e3, 3e3, 10e3, 30e3])
-       cur_tau = tau[self.read_tau()]
-       cur_freq = self.read_freq()
-       #Signal needs to stabilise
+       cur_tau = self._TAU[i_tau]
+       #Signal needs to stabilise: wait at most the settling time of the filter slope. After 3 tau, stop
+       #as soon as R changes by less than 1% in one tau; before that, steeper filters still look flat
        print('freq = ' + str(cur_freq) + ', tau = ' + str(cur_tau) + ', stabilising signal')
-       time.sleep(5*cur_tau)
+       deadline = time.monotonic() + self._SETTLE[int(self._query('OFSL?'))]*cur_tau
+       time.sleep(3*cur_tau)
+       r_old = self.read_r()
+       while time.monotonic() < deadline:
+           time.sleep(min(cur_tau, max(deadline - time.monotonic(), 0)))
+           r_new = self.read_r()
+           if abs(r_new - r_old) < 0.01*abs(r_new):
+               break
+           r_old = r_new
        
        xval = self.read_auto_x()
        return xval
@@ -229,3 +296,55 @@ class sr830:
         elif cur_freq > 4 and cur_coupl == 1:
             self.write_coupl(0) #set to AC coupling
             print(' <!> Changed lock-in (GPIB: ' + str(self.GPIBnum) + ') coupling to AC')
+
+    async def aread_x(self):
+        return float(await self._aquery('OUTP?1'))
+
+    async def aread_y(self):
+        return float(await self._aquery('OUTP?2'))
+
+    async def aread_r(self):
+        return float(await self._aquery('OUTP?3'))
+
+    async def aread_theta(self):
+        return float(await self._aquery('OUTP?4'))
+
+    async def aread_xy(self):
+        resp = (await self._aquery('SNAP?1,2')).split(',')
+        return float(resp[0]), float(resp[1])
+
+    async def aread_xyrtheta(self):
+        resp = (await self._aquery('SNAP?1,2,3,4')).split(',')
+        return float(resp[0]), float(resp[1]), float(resp[2]), float(resp[3])
+
+    async def aread_auxin1(self):
+        return float(await self._aquery('OAUX?1'))
+
+    async def aread_auxin_all(self):
+        resp = (await self._aquery('SNAP?5,6,7,8')).split(',')
+        return float(resp[0]), float(resp[1]), float(resp[2]), float(resp[3])
+
+    async def aread_dac_all(self):
+        # _query_multi takes the lock itself
+        return await asyncio.to_thread(self.read_dac_all)
+
+    async def aread_freq(self):
+        return float(await self._aquery('FREQ?'))
+
+    async def aread_amp(self):
+        return float(await self._aquery('SLVL?'))
+
+    async def aread_phase(self):
+        return float(await self._aquery('PHAS?'))
+
+    async def aread_sens(self):
+        return int(await self._aquery('SENS?'))
+
+    async def aread_tau(self):
+        return int(await self._aquery('OFLT?'))
+
+    async def aread_harm(self):
+        return int(await self._aquery('HARM?'))
+
+    async def aread_coupl(self):
+        return int(await self._aquery('ICPL?'))